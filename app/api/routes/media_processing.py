@@ -1,7 +1,5 @@
 import os
-import PyPDF2
 import asyncio
-import aiofiles
 from typing import List
 from openai import OpenAI
 from datetime import datetime
@@ -15,12 +13,21 @@ from ...services.assistant import Assistant
 from ...services.notes_service import NotesGeneration
 from ...services.media_converter import MediaConverter
 from ...services.youtube_service import YouTubeService
+from ...services.job_queue import job_queue
+from ...services.checkpoint_store import checkpoint_store
+from ...services.upload_sink import save_upload, UploadTooLargeError
+from ...services.content_index import content_index
+from ...services.memo import file_digest
+from ...services.pdf_extractor import pdf_extractor
+from ...services.extraction_cache import extraction_cache
+from ...services.lecture_store import LectureStore
 from ...services.quiz_generation import QuizGeneration
-from ...services.embedding_service import EmbeddingService
-from ...services.transcription_service import TranscriptionService
-from ...services.translation_service import LectureAnalysis, TranslationAnalysisService
+from ...services.embedding_service import EmbeddingService, embedding_cache
+from ...services.vector_index import vector_index_store
+from ...services.transcription_service import TranscriptionService, transcription_cache
+from ...services.translation_service import ANALYSIS_VERSION, LectureAnalysis, TranslationAnalysisService, chunking_options
 from ...services.live_data_formating import LiveDataFormating, AnalyzeLiveMediaRequest
-from ...services.lec_material_notes import extract_text_from_pdf, LectureMaterialNotes
+from ...services.lec_material_notes import LectureMaterialNotes
 from ...services.lecture_search_service import SearchRequest, LectureSearchService, SearchCourseRequest
 
 router = APIRouter()
@@ -36,7 +43,9 @@ async def analyze_live_media(request: AnalyzeLiveMediaRequest):
             "course_id": request.course_id,
             "date": datetime.now().date().isoformat(),
             "loading": True,
-            "progress": 0.0  # Start at 0%
+            "progress": 0.0,  # Start at 0%
+            # Its segments are written straight to version 1
+            "current_version": 1
         }).execute()
 
         response = await LiveDataFormating().format_data(request)
@@ -51,50 +60,31 @@ async def analyze_live_media(request: AnalyzeLiveMediaRequest):
             "description": response.overall_description,
         }).eq("lecture_id", lecture_response.data[0]['lecture_id']).execute()
 
-        # Insert Segments
-        for topic in response.topics:
-            segment_response = supabase.table("segments").insert({
+        # Insert Segments in one request
+        lecture_store = LectureStore()
+        youtube_service = YouTubeService()
+        segment_ids = lecture_store.insert_segments([
+            {
                 "lecture_id": lecture_response.data[0]['lecture_id'],
+                "version": 1,
                 "segment_start": topic["start_time"],
                 "segment_end": topic["end_time"],
                 "content": topic["translation"],
                 "topic": topic["topic"],
                 "description": topic["description"]
-            }).execute()
-
-            # Get the segment_id from the response
-            segment_id = segment_response.data[0]['id']
+            }
+            for topic in response.topics
+        ])
 
-            # Get YouTube resources for this segment's topic
-            youtube_resources = YouTubeService().get_related_videos(topic["topic"], max_results=2)
-
-            # Insert YouTube resources for this segment
-            for resource in youtube_resources:
-                supabase.table("segment_resources").insert({
-                    "segment_id": segment_id,
-                    "title": resource["title"],
-                    "url": resource["url"],
-                    "description": resource["description"],
-                    "thumbnail": resource["thumbnail"],
-                    "channel_name": resource["channel_name"],
-                    "published_at": resource["published_at"],
-                    "viewCount": resource["viewCount"],
-                }).execute()
+        # Get YouTube resources for each segment's topic and insert them together
+        lecture_store.insert_segment_resources({
+            segment_id: youtube_service.get_related_videos(topic["topic"], max_results=2)
+            for segment_id, topic in zip(segment_ids, response.topics)
+        })
 
         # Insert YouTube resources
-        youtube_service = YouTubeService()
         youtube_resources = youtube_service.get_related_videos(response.overall_topic)
-        for resource in youtube_resources:
-            supabase.table("resources").insert({
-                "lecture_id": lecture_response.data[0]['lecture_id'],
-                "title": resource["title"],
-                "url": resource["url"],
-                "description": resource["description"],
-                "thumbnail": resource["thumbnail"],
-                "channel_name": resource["channel_name"],
-                "published_at": resource["published_at"],
-                "viewCount": resource["viewCount"],
-            }).execute()
+        lecture_store.insert_resources(lecture_response.data[0]['lecture_id'], youtube_resources, version=1, with_view_count=True)
 
         # insert notes from sentences into respective segments
         for sentence in request.sentences:
@@ -120,7 +110,8 @@ async def analyze_live_media(request: AnalyzeLiveMediaRequest):
 
         supabase.table('lectures').update({
             "progress": 1.0,
-            "loading": False
+            "loading": False,
+            "current_version": 1
         }).eq('lecture_id', lecture_response.data[0]['lecture_id']).execute()
 
         return {
@@ -152,29 +143,25 @@ async def analyze_media(lecture_id: int, file: UploadFile = File(...)):
             "progress": 0.0
         }).eq("lecture_id", lecture_id).execute()
 
-        # Create temp directory if it doesn't exist
-        temp_dir = "temp_uploads"
-        os.makedirs(temp_dir, exist_ok=True)
-
-        # Save the file with a unique name to avoid conflicts
-        file_path = os.path.join(temp_dir, f"lecture_{file.filename}")
-
-        # Actually save the file to disk
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await file.read()  # async read
-            await out_file.write(content)  # async write
-
-        print('Saved file to:', file_path)
+        # Stream the file to a unique path on disk, hashing it on the way
+        upload = await save_upload(file, prefix="lecture_")
+        file_path = upload.file_path
 
         # Check if the file is a PDF
         if file_path.endswith('.pdf'):
             # Process the PDF file
-            asyncio.create_task(process_content(lecture_id, file_path))
+            job_id = await job_queue.enqueue("process_content", lecture_id=lecture_id, file_path=file_path, input_hash=upload.sha256)
         else:
             # Process the audio/video file
-            asyncio.create_task(process_recording(lecture_id, file_path))
-        return {"message": "Processing started", "lecture_id": lecture_id}
-
+            job_id = await job_queue.enqueue("process_recording", lecture_id=lecture_id, file_path=file_path, input_hash=upload.sha256)
+        return {"message": "Processing started", "lecture_id": lecture_id, "job_id": job_id, "bytes_received": upload.size}
+
+    except HTTPException:
+        raise
+    except UploadTooLargeError as e:
+        # No job was queued, so nothing else will clear the flag set above
+        supabase.table("lectures").update({"loading": False}).eq("lecture_id", lecture_id).execute()
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"Error analyzing media: {e}")
         # Clean up file if it exists
@@ -182,8 +169,11 @@ async def analyze_media(lecture_id: int, file: UploadFile = File(...)):
             os.remove(file_path)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_content(lecture_id: int, file_path: str):
-    """Process the textual content and update 'progress' column as each step completes."""
+async def process_content(lecture_id: int, file_path: str, input_hash: str = None):
+    """
+    Process the textual content and update 'progress' column as each step completes.
+    Every stage is checkpointed, so a retried job resumes at the first unfinished one.
+    """
     try:
         def update_progress(value: float):
             supabase.table("lectures") \
@@ -191,107 +181,133 @@ async def process_content(lecture_id: int, file_path: str):
                 .eq("lecture_id", lecture_id) \
                 .execute()
 
+        def run_stage(stage: str, func, *args):
+            return checkpoint_store.run_stage(lecture_id, input_hash, stage, func, *args)
+
         # Initialize services
         translation_service = TranslationAnalysisService()
         youtube_service = YouTubeService()
+        lecture_store = LectureStore()
+        if input_hash is None:
+            input_hash = await asyncio.to_thread(file_digest, file_path)
         update_progress(0.2)  # 20% done
 
         # 1) Grab all the content from the file assuming it's a PDF
-        if file_path.endswith('.pdf'):
-            text_content = extract_text_from_pdf(file_path)   
-        else:
+        if not file_path.endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Unsupported file format. Only PDF files are supported.")
+        text_content = await run_stage("extract", pdf_extractor.extract_text, file_path, None, input_hash)
         update_progress(0.4)  # 40% done
 
-        # 2) Get overall analysis
-        analysis = await translation_service.analyze_lecture_text(text_content)
+        # 2) Get overall analysis, reusing it if this file was analyzed before
+        async def analyze():
+            lecture_analysis = await translation_service.analyze_lecture_text(text_content)
+            return lecture_analysis.model_dump()
+
+        analysis = LectureAnalysis.model_validate(
+            await run_stage("analyze", content_index.get_or_compute, input_hash, "lecture_analysis", {
+                "version": ANALYSIS_VERSION,
+                "pdf_token_budget": settings.PDF_EXTRACTION_TOKEN_BUDGET,
+            }, analyze)
+        )
         print('analysis:', analysis)
         update_progress(0.6)  # 60% done
 
         # 3) Get YouTube resources
-        youtube_resources = []
-        for keyword in analysis.overall_keywords:
-            print('keyword:', keyword)
-            youtube_resources.extend(youtube_service.get_related_videos(keyword, max_results=1))
+        def get_youtube_resources():
+            resources = []
+            for keyword in analysis.overall_keywords:
+                print('keyword:', keyword)
+                resources.extend(youtube_service.get_related_videos(keyword, max_results=1))
+            return resources
+
+        youtube_resources = await run_stage("youtube", get_youtube_resources)
         update_progress(0.7)  # 70% done
 
-        # 4) Clear old segments/resources
-        segments_to_be_deleted = supabase.table("segments").select("id").eq("lecture_id", lecture_id).execute()
-        for segment in segments_to_be_deleted.data:
-            # Adjust to access `id` based on the structure
-            supabase.table("segment_resources").delete().eq("segment_id", segment['id']).execute()
-        supabase.table("segments").delete().eq("lecture_id", lecture_id).execute()
-        supabase.table("resources").delete().eq("lecture_id", lecture_id).execute()
-        
-        # 5) Update main lecture data
-        supabase.table("lectures").update({
-            "summary": analysis.comprehensive_summary,
-            "loading": False,
-            "topic": analysis.overall_topic,
-            "description": analysis.content_description,
-        }).eq("lecture_id", lecture_id).execute()
-        update_progress(0.8)  # 80% done
-
-        # 6) Insert YouTube resources
-        for resource in youtube_resources:
-            supabase.table("resources").insert({
-                "lecture_id": lecture_id,
-                "title": resource["title"],
-                "url": resource["url"],
-                "description": resource["description"],
-                "thumbnail": resource["thumbnail"],
-                "channel_name": resource["channel_name"],
-                "published_at": resource["published_at"],
-            }).execute()
-        update_progress(0.9)  # 90% done
+        def write_segments():
+            # 4) Start a new lecture version, readers keep seeing the current one
+            version = lecture_store.begin_version(lecture_id)
 
-        # 7) Insert Segments
-        for segment in analysis.subtopics:
-            segment_response = supabase.table("segments").insert({
-                "lecture_id": lecture_id,
-                "content": segment.original_content,
-                "segment_start": 0,
-                "segment_end": 0,
-                "topic": segment.title,
-                "description": segment.specific_summary ,
-                "segment_notes": segment.detailed_description
-            }).execute()
-
-            # Get the segment_id from the response
-            segment_id = segment_response.data[0]['id']
-
-            # Get YouTube resources for this segment's topic
-            segment_youtube_resources = []
-            for keyword in segment.key_terminology:
-                segment_youtube_resources.extend(youtube_service.get_related_videos(keyword, max_results=1))
-            for resource in segment_youtube_resources:
-                supabase.table("segment_resources").insert({
-                    "segment_id": segment_id,
-                    "title": resource["title"],
-                    "url": resource["url"],
-                    "description": resource["description"],
-                    "thumbnail": resource["thumbnail"],
-                    "channel_name": resource["channel_name"],
-                    "published_at": resource["published_at"],
-                    "viewCount": resource["viewCount"],
-                }).execute()
+            # 5) Insert YouTube resources
+            lecture_store.insert_resources(lecture_id, youtube_resources, version=version)
+            update_progress(0.8)  # 80% done
 
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        vector_store = client.vector_stores.create(name=analysis.overall_topic + "_" + str(lecture_id))
-        supabase.table("lectures").update({
-            "vectorstore_id": vector_store.id,
-        }).eq("lecture_id", lecture_id).execute()
+            # 6) Insert Segments in one request
+            segment_ids = lecture_store.insert_segments([
+                {
+                    "lecture_id": lecture_id,
+                    "version": version,
+                    "content": segment.original_content,
+                    "segment_start": 0,
+                    "segment_end": 0,
+                    "topic": segment.title,
+                    "description": segment.specific_summary ,
+                    "segment_notes": segment.detailed_description
+                }
+                for segment in analysis.subtopics
+            ])
+
+            # Get YouTube resources for each segment's key terms and insert them together
+            resources_by_segment = {}
+            for segment_id, segment in zip(segment_ids, analysis.subtopics):
+                resources_by_segment[segment_id] = []
+                for keyword in segment.key_terminology:
+                    resources_by_segment[segment_id].extend(youtube_service.get_related_videos(keyword, max_results=1))
+            lecture_store.insert_segment_resources(resources_by_segment)
+            update_progress(0.9)  # 90% done
+            return version
+
+        version = await run_stage("segments", write_segments)
+        if not checkpoint_store.load(lecture_id, input_hash, "publish")[0] \
+                and lecture_store.is_superseded(lecture_id, version):
+            # Another job published over the checkpointed version since, write a new one
+            print(f"Version {version} of lecture {lecture_id} was superseded, writing a new version")
+            checkpoint_store.clear_stages(lecture_id, input_hash, ["segments", "notes"])
+            version = await run_stage("segments", write_segments)
+
+        # 7) Make the new version live together with the main lecture data, then drop the old one
+        def publish():
+            published = lecture_store.publish_version(lecture_id, version, {
+                "summary": analysis.comprehensive_summary,
+                "loading": False,
+                "topic": analysis.overall_topic,
+                "description": analysis.content_description,
+            })
+            if not published:
+                # A newer version went live while this one was being written
+                print(f"Version {version} of lecture {lecture_id} was superseded, discarding it")
+                lecture_store.discard_version(lecture_id, version)
+                return False
+            lecture_store.clear_lecture_artifacts(lecture_id, keep_version=version)
+            return True
+
+        await run_stage("publish", publish)
+
+        # 8) Create a vector store on openai for this specific lecture
+        def create_vector_store():
+            client = OpenAI(api_key=settings.OPENAI_API_KEY)
+            vector_store = client.vector_stores.create(name=analysis.overall_topic + "_" + str(lecture_id))
+            supabase.table("lectures").update({
+                "vectorstore_id": vector_store.id,
+            }).eq("lecture_id", lecture_id).execute()
+            return vector_store.id
+
+        await run_stage("vector_store", create_vector_store)
 
         update_progress(1.0)  # 100% done
 
-        await generate_embeddings(EmbeddingRequest(lecture_id=lecture_id))
+        await run_stage("embeddings", generate_embeddings, EmbeddingRequest(lecture_id=lecture_id))
+        checkpoint_store.clear(lecture_id, input_hash)
         print(f"Processing completed for lecture {lecture_id}")
 
     except Exception as e:
         print(f"Error processing content: {e}")
+        raise e
 
-async def process_recording(lecture_id: int, file_path: str):
-    """Process the Recording and update 'progress' column as each step completes."""
+async def process_recording(lecture_id: int, file_path: str, input_hash: str = None):
+    """
+    Process the Recording and update 'progress' column as each step completes.
+    Every stage is checkpointed, so a retried job resumes at the first unfinished one.
+    """
     try:
         def update_progress(value: float):
             supabase.table("lectures") \
@@ -299,115 +315,161 @@ async def process_recording(lecture_id: int, file_path: str):
                 .eq("lecture_id", lecture_id) \
                 .execute()
 
+        def run_stage(stage: str, func, *args):
+            return checkpoint_store.run_stage(lecture_id, input_hash, stage, func, *args)
+
         # Initialize services
         media_converter = MediaConverter()
         transcription_service = TranscriptionService()
         translation_service = TranslationAnalysisService()
         youtube_service = YouTubeService()
+        lecture_store = LectureStore()
+        if input_hash is None:
+            input_hash = await asyncio.to_thread(file_digest, file_path)
 
         # 2) Download the file from Supabase storage
         # transcription_file = await media_converter.fetch_file_from_supabase('recordings', file_name)
         # update_progress(0.1)  # 10% done
 
-        # 3) Convert to audio if it's an MP4
-        # Convert to audio if it's an MP4
-
-        audio_path = file_path
         update_progress(0.2)  # 20% done
 
-        # 4) Transcribe
-        hindi_transcription = await transcription_service.transcribe_audio(audio_path)
-        paragraphs = hindi_transcription.get('paragraphs', [])
-        print('paragraphs:', paragraphs)
-        update_progress(0.4)  # 40% done
-
-        # 5) Translate and analyze
-        analysis = await translation_service.analyze_full_text(paragraphs)
+        async def transcribe_recording():
+            # 3) Extract a compact mono speech track, audio only, before uploading to the ASR backend
+            audio = await media_converter.normalize_audio(file_path)
+            try:
+                if settings.TRANSCRIPTION_WINDOWED:
+                    return await transcription_service.transcribe_windowed(audio.file_path)
+                return await transcription_service.transcribe_audio(audio.file_path, audio.mimetype)
+            finally:
+                media_converter.discard_normalized(audio)
+
+        # 4) Transcribe and 5) translate and analyze, reusing earlier results for this recording
+        async def analyze():
+            found, hindi_transcription = checkpoint_store.load(lecture_id, input_hash, "transcribe")
+            if not found:
+                found, hindi_transcription = content_index.get(input_hash, "transcription", transcription_service.options)
+
+            if settings.RECORDING_PIPELINE_MODE == "streaming" and not found:
+                # Analyze each window's paragraphs while the later windows are still transcribing
+                audio = await media_converter.normalize_audio(file_path)
+                try:
+                    hindi_transcription, full_analysis = await translation_service.analyze_transcription_stream(
+                        transcription_service.transcribe_windows(audio.file_path)
+                    )
+                finally:
+                    media_converter.discard_normalized(audio)
+                content_index.put(input_hash, "transcription", transcription_service.options, hindi_transcription)
+                checkpoint_store.save(lecture_id, input_hash, "transcribe", hindi_transcription)
+            else:
+                if not found:
+                    hindi_transcription = await run_stage(
+                        "transcribe", content_index.get_or_compute, input_hash, "transcription",
+                        transcription_service.options, transcribe_recording
+                    )
+                update_progress(0.4)  # 40% done
+                full_analysis = await translation_service.analyze_full_text(hindi_transcription.get('paragraphs', []))
+
+            # Chunk results are pydantic models, store them as plain dicts
+            full_analysis["topics"] = [
+                chunk.model_dump() if isinstance(chunk, BaseModel) else chunk
+                for chunk in full_analysis["topics"]
+            ]
+            return full_analysis
+
+        analysis = await run_stage(
+            "analyze", content_index.get_or_compute, input_hash, "recording_analysis", {
+                "version": ANALYSIS_VERSION,
+                "deepgram": transcription_service.options,
+                "pipeline_mode": settings.RECORDING_PIPELINE_MODE,
+                "windowed": settings.TRANSCRIPTION_WINDOWED,
+                "window_seconds": settings.TRANSCRIPTION_WINDOW_SECONDS,
+                "window_overlap": settings.TRANSCRIPTION_WINDOW_OVERLAP,
+                "audio_normalization": settings.AUDIO_NORMALIZATION,
+                "normalized_bitrate": settings.NORMALIZED_AUDIO_BITRATE,
+                **chunking_options(),
+            }, analyze
+        )
         update_progress(0.6)  # 60% done
 
         # 6) Get YouTube resources
-        youtube_resources = youtube_service.get_related_videos(analysis['overall_topic'])
+        youtube_resources = await run_stage("youtube", youtube_service.get_related_videos, analysis['overall_topic'])
         update_progress(0.7)  # 70% done
 
-        # 7) Clear old segments/resources
-
-        segments_to_be_deleted = supabase.table("segments").select("id").eq("lecture_id", lecture_id).execute()
+        def write_segments():
+            # 7) Start a new lecture version, readers keep seeing the current one
+            version = lecture_store.begin_version(lecture_id)
 
-        for segment in segments_to_be_deleted.data:
-            # Adjust to access `id` based on the structure
-            supabase.table("segment_resources").delete().eq("segment_id", segment['id']).execute()
+            # 8) Insert YouTube resources
+            lecture_store.insert_resources(lecture_id, youtube_resources, version=version)
+            update_progress(0.8)  # 80% done
 
-        supabase.table("segments").delete().eq("lecture_id", lecture_id).execute()
-        supabase.table("resources").delete().eq("lecture_id", lecture_id).execute()
-
-        # 8) Update main lecture data
-        supabase.table("lectures").update({
-            "summary": analysis['overall_summary'],
-            "loading": False,
-            "topic": analysis["overall_topic"],
-            "description": analysis["overall_description"],
-        }).eq("lecture_id", lecture_id).execute()
-        update_progress(0.8)  # 80% done
-
-        # 9) Insert YouTube resources
-        for resource in youtube_resources:
-            supabase.table("resources").insert({
-                "lecture_id": lecture_id,
-                "title": resource["title"],
-                "url": resource["url"],
-                "description": resource["description"],
-                "thumbnail": resource["thumbnail"],
-                "channel_name": resource["channel_name"],
-                "published_at": resource["published_at"],
-            }).execute()
-        update_progress(0.9)  # 90% done
-
-        # 10) Insert Segments
-        for paragraph in analysis["topics"]:
-            for topic in paragraph.topics:
-                # First insert the segment
-                segment_response = supabase.table("segments").insert({
+            # 9) Insert Segments in one request
+            topics = [topic for paragraph in analysis["topics"] for topic in paragraph["topics"]]
+            segment_ids = lecture_store.insert_segments([
+                {
                     "lecture_id": lecture_id,
+                    "version": version,
                     "segment_start": topic["start_time"],
                     "segment_end": topic["end_time"],
                     "content": topic["translation"],
                     "topic": topic["topic"],
                     "description": topic["description"]
-                }).execute()
+                }
+                for topic in topics
+            ])
+
+            # Get YouTube resources for each segment's topic and insert them together
+            lecture_store.insert_segment_resources({
+                segment_id: youtube_service.get_related_videos(topic["topic"], max_results=2)
+                for segment_id, topic in zip(segment_ids, topics)
+            })
+            return version
+
+        version = await run_stage("segments", write_segments)
+        if not checkpoint_store.load(lecture_id, input_hash, "publish")[0] \
+                and lecture_store.is_superseded(lecture_id, version):
+            # Another job published over the checkpointed version since, write a new one
+            print(f"Version {version} of lecture {lecture_id} was superseded, writing a new version")
+            checkpoint_store.clear_stages(lecture_id, input_hash, ["segments", "notes"])
+            version = await run_stage("segments", write_segments)
+
+        # 10) Generate Notes for the new version before it goes live
+        await run_stage("notes", generate_notes, lecture_id, version)
+        update_progress(0.9)  # 90% done
+
+        # 11) Make the new version live together with the main lecture data, then drop the old one
+        def publish():
+            published = lecture_store.publish_version(lecture_id, version, {
+                "summary": analysis['overall_summary'],
+                "loading": False,
+                "topic": analysis["overall_topic"],
+                "description": analysis["overall_description"],
+            })
+            if not published:
+                # A newer version went live while this one was being written
+                print(f"Version {version} of lecture {lecture_id} was superseded, discarding it")
+                lecture_store.discard_version(lecture_id, version)
+                return False
+            lecture_store.clear_lecture_artifacts(lecture_id, keep_version=version)
+            return True
+
+        await run_stage("publish", publish)
 
-                print('segment_response:', segment_response)
-                # Get the segment_id from the response
-                segment_id = segment_response.data[0]['id']  # Assuming this is how Supabase returns the id
-
-                # Get YouTube resources for this segment's topic
-                segment_youtube_resources = youtube_service.get_related_videos(topic["topic"], max_results=2)
-
-                # Insert YouTube resources for this segment
-                for resource in segment_youtube_resources:
-                    supabase.table("segment_resources").insert({
-                        "segment_id": segment_id,
-                        "title": resource["title"],
-                        "url": resource["url"],
-                        "description": resource["description"],
-                        "thumbnail": resource["thumbnail"],
-                        "channel_name": resource["channel_name"],
-                        "published_at": resource["published_at"],
-                        "viewCount": resource["viewCount"],
-                    }).execute()
-
-        # 11) Generate Notes 
-        await generate_notes(lecture_id)
-        
         # 12) Create a vector store on openai for this specific lecture
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        vector_store = client.vector_stores.create(name=resource["title"]+"_" + str(lecture_id))
-        supabase.table("lectures").update({
-            "vectorstore_id": vector_store.id,
-        }).eq("lecture_id", lecture_id).execute()
+        def create_vector_store():
+            client = OpenAI(api_key=settings.OPENAI_API_KEY)
+            vector_store = client.vector_stores.create(name=analysis["overall_topic"] + "_" + str(lecture_id))
+            supabase.table("lectures").update({
+                "vectorstore_id": vector_store.id,
+            }).eq("lecture_id", lecture_id).execute()
+            return vector_store.id
+
+        await run_stage("vector_store", create_vector_store)
 
         # 13) Mark done
         update_progress(1.0)  # 100% done
-        await generate_embeddings(EmbeddingRequest(lecture_id=lecture_id))
+        await run_stage("embeddings", generate_embeddings, EmbeddingRequest(lecture_id=lecture_id))
+        checkpoint_store.clear(lecture_id, input_hash)
         print(f"Processing completed for lecture {lecture_id}")
 
     except Exception as e:
@@ -419,10 +481,11 @@ async def process_recording(lecture_id: int, file_path: str):
         }).eq("lecture_id", lecture_id).execute()
         print(f"Error processing lecture {lecture_id}: {e}")
         raise e
-    finally:
-        # Clean up temporary file
-        if os.path.exists(file_path):
-            os.remove(file_path)
+
+def remove_upload(file_path: str, **kwargs):
+    """Remove the uploaded file once its job will not be retried anymore."""
+    if os.path.exists(file_path):
+        os.remove(file_path)
 
 # Add this new endpoint
 @router.post("/analyze-material", response_model=dict)
@@ -433,36 +496,58 @@ async def analyze_material(material_id: int , file: UploadFile = File(...)):
             "progress": 0.0
         }).eq("material_id", material_id).execute()
 
-        # Create temp directory if it doesn't exist
-        temp_dir = "temp_uploads"
-        os.makedirs(temp_dir, exist_ok=True)
-
-        # Save the file with a unique name to avoid conflicts
-        file_path = os.path.join(temp_dir, f"lecture_{file.filename}")
+        # Stream the file to a unique path on disk
+        upload = await save_upload(file, prefix="material_")
+        file_path = upload.file_path
 
-        # Actually save the file to disk
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await file.read()  # async read
-            await out_file.write(content)  # async write
-        
         file_type = file_path.split('.')[-1]
         print('file_type:', file_type)
-        material_notes = LectureMaterialNotes(material_id, file_path, file_type)
-        asyncio.create_task(material_notes.analyze_material())
+        job_id = await job_queue.enqueue("analyze_material", material_id=material_id, file_path=file_path, file_type=file_type, input_hash=upload.sha256)
 
-        return {"message": "Processing started", "material_id": material_id}
+        return {"message": "Processing started", "material_id": material_id, "job_id": job_id, "bytes_received": upload.size}
 
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"Error analyzing media: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def process_material(material_id: int, file_path: str, file_type: str, input_hash: str = None):
+    """Run the lecture material pipeline for an uploaded file."""
+    material_notes = LectureMaterialNotes(material_id, file_path, file_type, input_hash=input_hash)
+    await material_notes.analyze_material()
+
+
+job_queue.register("process_content", process_content, cleanup=remove_upload)
+job_queue.register("process_recording", process_recording, cleanup=remove_upload)
+job_queue.register("analyze_material", process_material, cleanup=remove_upload)
+
+
+@router.get("/cache_stats", response_model=dict)
+async def get_cache_stats():
+    return {
+        "transcription": transcription_cache.stats(),
+        "content_index": content_index.stats(),
+        "extraction": extraction_cache.stats(),
+        "embedding": embedding_cache.stats(),
+        "vector_index": vector_index_store.stats(),
+    }
+
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_job_status(job_id: int):
+    job = await job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
 class EmbeddingRequest(BaseModel):
     lecture_id: int
 
 @router.post('/generate_embeddings')
 async def generate_embeddings(request: EmbeddingRequest):
     try:
-        EmbeddingService().generate_embeddings(request.lecture_id)
+        await asyncio.to_thread(EmbeddingService().generate_embeddings, request.lecture_id)
         return {"message": "Embeddings generated successfully"}
     except Exception as e:
         print(f"Error generating embeddings: {e}")
@@ -484,7 +569,7 @@ class CourseEmbeddingRequest(BaseModel):
 @router.post('/generate_course_embeddings')
 async def generate_course_embeddings(request: CourseEmbeddingRequest):
     try:
-        EmbeddingService().generate_course_embeddings(course_id=request.course_id)
+        await asyncio.to_thread(EmbeddingService().generate_course_embeddings, course_id=request.course_id)
         return {"message": "Course embeddings generated successfully"}
     except Exception as e:
         print(f"Error generating course embeddings: {e}")
@@ -517,9 +602,9 @@ async def generate_quiz(request: QuizGenerationRequest) -> List[dict]:
     
 
 @router.post('/generate_notes')
-async def generate_notes(lecture_id: int) -> List[dict]:
+async def generate_notes(lecture_id: int, version: int = None) -> List[dict]:
     try:
-        notes = NotesGeneration(lecture_id)
+        notes = NotesGeneration(lecture_id, version=version)
         notes_data = await notes.generate_notes()
         # Update the notes in the database
         for notes in notes_data:
@@ -1,3 +1,5 @@
+from typing import Dict, Optional
+
 from pydantic_settings import BaseSettings
 import dotenv
 import os
@@ -11,8 +13,75 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_KEY: str
     UPLOAD_FOLDER: str = "uploads"
+    TEMP_UPLOAD_DIR: str = "temp_uploads"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    MAX_UPLOAD_SIZE: int = 4 * 1024 * 1024 * 1024
     ANTHROPIC_API_KEY: str
 
+    # Background jobs
+    JOB_DB_PATH: str = "jobs.db"
+    JOB_WORKERS: int = 2
+    JOB_POLL_INTERVAL: float = 5.0
+    JOB_MAX_ATTEMPTS: int = 3
+    # A failed attempt is retried after JOB_RETRY_DELAY seconds, doubled per attempt up to JOB_RETRY_MAX_DELAY
+    JOB_RETRY_DELAY: float = 30.0
+    JOB_RETRY_MAX_DELAY: float = 900.0
+    # Running jobs refresh their heartbeat this often; a job without one for JOB_STALE_AFTER seconds is recovered
+    JOB_HEARTBEAT_INTERVAL: float = 15.0
+    JOB_STALE_AFTER: float = 60.0
+    CHECKPOINT_DB_PATH: str = "checkpoints.db"
+    CONTENT_INDEX_DB_PATH: str = "content_index.db"
+    CONTENT_INDEX_MAX_BYTES: int = 1024 * 1024 * 1024
+
+    # Transcript analysis
+    ANALYSIS_CONCURRENCY: int = 4
+    ANALYSIS_MAX_ATTEMPTS: int = 3
+    CHUNK_INPUT_TOKEN_BUDGET: int = 6000
+    CHUNK_OUTPUT_TOKEN_BUDGET: int = 12000
+    CHUNK_OUTPUT_RATIO: float = 1.2
+    OVERALL_ANALYSIS_FAN_IN: int = 8
+
+    # Recording pipeline: "sequential" transcribes the whole file before
+    # analysis starts, "streaming" overlaps windowed transcription with analysis
+    RECORDING_PIPELINE_MODE: str = "sequential"
+    TRANSCRIPTION_WINDOW_SECONDS: float = 600.0
+    # Transcribe long recordings as concurrent windows cut at silences
+    TRANSCRIPTION_WINDOWED: bool = False
+    TRANSCRIPTION_WINDOW_OVERLAP: float = 2.0
+    TRANSCRIPTION_CONCURRENCY: int = 4
+    TRANSCRIPTION_MAX_ATTEMPTS: int = 3
+    TRANSCRIPTION_CACHE_DB_PATH: str = "transcription_cache.db"
+    TRANSCRIPTION_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    # Re-encode uploads to mono 16 kHz speech audio before they go to Deepgram
+    AUDIO_NORMALIZATION: bool = True
+    NORMALIZED_AUDIO_BITRATE: str = "24k"
+    AUDIO_EXTRACTION_CONCURRENCY: int = 2
+
+    # Worker processes for CPU-bound parsing, with a concurrency limit per task kind
+    PROCESS_POOL_WORKERS: int = 2
+    PROCESS_POOL_LIMITS: Dict[str, int] = {"pdf": 2, "pptx": 2, "docx": 1}
+    PROCESS_POOL_TIMEOUT: float = 300.0
+    PDF_PAGES_PER_TASK: int = 20
+    # Stop extracting a PDF once this many tokens were read, None reads the whole file
+    PDF_EXTRACTION_TOKEN_BUDGET: Optional[int] = None
+    EXTRACTION_CACHE_DB_PATH: str = "extraction_cache.db"
+    EXTRACTION_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Embeddings: inputs and tokens per embeddings request, rows per bulk write
+    EMBEDDING_BATCH_SIZE: int = 512
+    EMBEDDING_BATCH_TOKENS: int = 100000
+    EMBEDDING_WRITE_BATCH_SIZE: int = 100
+    EMBEDDING_CACHE_DB_PATH: str = "embedding_cache.db"
+    EMBEDDING_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Search: "rpc" uses the match_* database functions, "local" in-process vector indexes (single host only)
+    VECTOR_SEARCH: str = "rpc"
+    VECTOR_INDEX_DIR: str = "vector_index"
+    VECTOR_INDEX_MAX_LOADED: int = 64
+    # "float32", "float16" or "int8"; quantized indexes re-rank this many candidates exactly, 0 disables it
+    VECTOR_INDEX_DTYPE: str = "int8"
+    VECTOR_INDEX_RERANK: int = 50
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,64 @@
+import os
+from typing import Tuple
+
+from .audio_splitter import AudioSplitterError, probe_audio_codec, run_ffmpeg
+
+# Containers that can hold each audio codec as-is, so the track can be stream-copied
+STREAM_COPY_CONTAINERS = {
+    'aac': '.m4a',
+    'alac': '.m4a',
+    'mp3': '.mp3',
+    'opus': '.ogg',
+    'vorbis': '.ogg',
+    'flac': '.flac',
+    'pcm_s16le': '.wav',
+    'pcm_s24le': '.wav',
+    'pcm_f32le': '.wav',
+}
+
+
+class AudioExtractor:
+    """
+    Audio extraction through ffmpeg subprocesses.
+
+    The audio track is demuxed and stream-copied when its codec fits a plain
+    audio container, which takes seconds even for long videos, and is only
+    transcoded to MP3 otherwise. Work runs in subprocesses, off the event
+    loop; like every ffmpeg run (probes, silence detection and window cuts
+    included) it shares the AUDIO_EXTRACTION_CONCURRENCY cap of `run_ffmpeg`.
+    """
+
+    async def run_ffmpeg(self, *args: str) -> Tuple[bytes, bytes]:
+        return await run_ffmpeg(*args)
+
+    async def extract(self, media_path: str, out_base: str = None) -> str:
+        """Write the audio track of `media_path` next to it (or to `out_base` + extension)."""
+        out_base = out_base or media_path.rsplit(".", 1)[0]
+        codec = await probe_audio_codec(media_path)
+        if codec is None:
+            raise AudioSplitterError(f"No audio stream found in {media_path}")
+
+        container = STREAM_COPY_CONTAINERS.get(codec)
+        if container is not None:
+            out_path = out_base + container
+            if out_path != media_path:
+                try:
+                    await self.run_ffmpeg('-y', '-i', media_path, '-vn', '-map', '0:a:0', '-c:a', 'copy', out_path)
+                    print(f"Stream-copied {codec} audio from {media_path}")
+                    return out_path
+                except AudioSplitterError as e:
+                    print(f"Stream copy of {codec} audio failed, transcoding instead: {e}")
+                    if os.path.exists(out_path):
+                        os.remove(out_path)
+
+        out_path = out_base + ".mp3"
+        if out_path == media_path:
+            out_path = out_base + ".audio.mp3"
+        await self.run_ffmpeg(
+            '-y', '-i', media_path, '-vn', '-map', '0:a:0', '-c:a', 'libmp3lame', '-q:a', '4', out_path
+        )
+        print(f"Transcoded {codec} audio from {media_path} to mp3")
+        return out_path
+
+
+audio_extractor = AudioExtractor()
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import re
+import tempfile
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
+
+import imageio_ffmpeg
+
+from ..core.config import settings
+
+
+class AudioSplitterError(Exception):
+    """Custom exception for ffmpeg failures"""
+    pass
+
+
+class AudioWindow(NamedTuple):
+    # Range of audio that is cut out and transcribed
+    start: float
+    end: float
+    # Range this window is responsible for when windows are stitched together
+    own_start: float
+    own_end: float
+
+
+_ffmpeg_slots: Optional[asyncio.Semaphore] = None
+
+
+def ffmpeg_exe() -> str:
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def ffmpeg_slots() -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop
+    global _ffmpeg_slots
+    if _ffmpeg_slots is None:
+        _ffmpeg_slots = asyncio.Semaphore(settings.AUDIO_EXTRACTION_CONCURRENCY)
+    return _ffmpeg_slots
+
+
+async def run_ffmpeg(*args: str) -> Tuple[bytes, bytes]:
+    """
+    Run ffmpeg in a subprocess without blocking the event loop. At most
+    AUDIO_EXTRACTION_CONCURRENCY of these run at once in this process.
+    """
+    async with ffmpeg_slots():
+        process = await asyncio.create_subprocess_exec(
+            ffmpeg_exe(), '-hide_banner', '-nostdin', *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise AudioSplitterError(
+            f"ffmpeg exited with {process.returncode}: {stderr.decode(errors='ignore')[-500:]}"
+        )
+    return stdout, stderr
+
+
+async def probe_banner(media_path: str) -> str:
+    """
+    ffmpeg's description of an input file (it exits with an error without
+    an output, that is expected). Counts against the same cap as run_ffmpeg.
+    """
+    async with ffmpeg_slots():
+        process = await asyncio.create_subprocess_exec(
+            ffmpeg_exe(), '-hide_banner', '-nostdin', '-i', media_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+    return stderr.decode(errors='ignore')
+
+
+async def probe_audio_codec(media_path: str) -> Optional[str]:
+    """Codec name of the first audio stream, None if there is no audio stream."""
+    match = re.search(r"Stream #\d+:\d+.*?: Audio: (\w+)", await probe_banner(media_path))
+    return match.group(1) if match else None
+
+
+async def probe_duration(media_path: str) -> float:
+    """Duration of a media file in seconds, read from ffmpeg's input banner."""
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", await probe_banner(media_path))
+    if not match:
+        raise AudioSplitterError(f"Could not read the duration of {media_path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+async def detect_silences(media_path: str, start: float = 0.0, end: float = None,
+                          noise_db: float = -35.0, min_silence: float = 0.5) -> List[Tuple[float, float]]:
+    """
+    (start, end) of every stretch of silence between `start` and `end` (the
+    whole file by default), in seconds from the start of the file, using
+    ffmpeg's silencedetect filter.
+    """
+    window_args = ['-ss', f"{start:.3f}"] if start else []
+    if end is not None:
+        window_args += ['-t', f"{end - start:.3f}"]
+    _, stderr = await run_ffmpeg(
+        *window_args, '-i', media_path, '-vn',
+        '-af', f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        '-f', 'null', '-',
+    )
+    output = stderr.decode(errors='ignore')
+    starts = [start + float(value) for value in re.findall(r"silence_start: (-?\d+(?:\.\d+)?)", output)]
+    ends = [start + float(value) for value in re.findall(r"silence_end: (\d+(?:\.\d+)?)", output)]
+    return list(zip(starts, ends))
+
+
+async def windows_at_silences(media_path: str, duration: float, window_seconds: float,
+                              overlap_seconds: float = 2.0, search_seconds: float = 60.0) -> AsyncIterator[AudioWindow]:
+    """
+    Split a recording into windows of roughly `window_seconds`, moving every
+    cut to the middle of the nearest silence within `search_seconds` so that
+    words are not cut in half. Each window is padded by `overlap_seconds` on
+    both sides, and owns the range between its two cuts.
+
+    Silences are only detected around each cut, just before its window is
+    yielded, so the first window is ready after decoding a couple of minutes
+    of audio rather than the whole recording.
+    """
+    own_start = 0.0
+    while own_start < duration:
+        target = own_start + window_seconds
+        if target >= duration:
+            own_end = duration
+        else:
+            silences = await detect_silences(
+                media_path, max(own_start, target - search_seconds), min(duration, target + search_seconds)
+            )
+            candidates = [point for point in ((start + end) / 2 for start, end in silences)
+                          if abs(point - target) <= search_seconds and point > own_start]
+            own_end = min(candidates, key=lambda point: abs(point - target)) if candidates else target
+        yield AudioWindow(
+            start=max(0.0, own_start - overlap_seconds),
+            end=min(duration, own_end + overlap_seconds),
+            own_start=own_start,
+            own_end=own_end if own_end < duration else float('inf'),
+        )
+        own_start = own_end
+
+
+async def extract_window(media_path: str, start: float, end: float, out_dir: str = None) -> str:
+    """Cut [start, end) out of a media file as compact mono mp3, returns the new file path."""
+    fd, out_path = tempfile.mkstemp(suffix='.mp3', dir=out_dir)
+    os.close(fd)
+    try:
+        await run_ffmpeg(
+            '-y', '-ss', f"{start:.3f}", '-t', f"{end - start:.3f}", '-i', media_path,
+            '-vn', '-ac', '1', '-ar', '16000', '-c:a', 'libmp3lame', '-b:a', '48k',
+            out_path,
+        )
+    except BaseException:
+        os.remove(out_path)
+        raise
+    return out_path
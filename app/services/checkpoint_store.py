@@ -0,0 +1,83 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from ..core.config import settings
+from .memo import load_or_compute
+
+
+class CheckpointStore:
+    """
+    Local SQLite store for the output of each pipeline stage.
+
+    Outputs are keyed by lecture id, the hash of the pipeline input and the
+    stage name, so a retried job can skip every stage that already finished
+    for the same input.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or settings.CHECKPOINT_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    lecture_id INTEGER NOT NULL,
+                    input_hash TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (lecture_id, input_hash, stage)
+                )
+            """)
+
+    def load(self, lecture_id: int, input_hash: str, stage: str) -> Tuple[bool, Any]:
+        """Return (found, output) for a stage."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output FROM checkpoints WHERE lecture_id = ? AND input_hash = ? AND stage = ?",
+                (lecture_id, input_hash, stage)
+            ).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0])
+
+    def save(self, lecture_id: int, input_hash: str, stage: str, output: Any):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (lecture_id, input_hash, stage, output, created_at) VALUES (?, ?, ?, ?, ?)",
+                (lecture_id, input_hash, stage, json.dumps(output), datetime.now().isoformat())
+            )
+
+    def clear(self, lecture_id: int, input_hash: Optional[str] = None):
+        """Drop the checkpoints of a lecture, optionally only for one input."""
+        with self._lock, self._conn:
+            if input_hash is None:
+                self._conn.execute("DELETE FROM checkpoints WHERE lecture_id = ?", (lecture_id,))
+            else:
+                self._conn.execute(
+                    "DELETE FROM checkpoints WHERE lecture_id = ? AND input_hash = ?",
+                    (lecture_id, input_hash)
+                )
+
+    def clear_stages(self, lecture_id: int, input_hash: str, stages: List[str]):
+        """Drop the checkpoints of some stages, so they run again on the next attempt."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM checkpoints WHERE lecture_id = ? AND input_hash = ? AND stage = ?",
+                [(lecture_id, input_hash, stage) for stage in stages]
+            )
+
+    async def run_stage(self, lecture_id: int, input_hash: str, stage: str, func: Callable, *args, **kwargs) -> Any:
+        """Return the checkpointed output of a stage, or run it and save its output."""
+        return await load_or_compute(
+            lambda: self.load(lecture_id, input_hash, stage),
+            lambda output: self.save(lecture_id, input_hash, stage, output),
+            f"Resuming lecture {lecture_id}: stage '{stage}' already completed",
+            func, *args, **kwargs
+        )
+
+
+checkpoint_store = CheckpointStore()
@@ -0,0 +1,54 @@
+import json
+from typing import Any, Callable, Dict, Tuple
+
+from ..core.config import settings
+from .disk_cache import DiskCache
+from .memo import load_or_compute, options_key
+
+
+class ContentIndex:
+    """
+    Content-addressed index of processed uploads.
+
+    Stores the expensive, lecture-independent output of a pipeline step
+    (transcription, analysis, ...) keyed by the file digest, the kind of
+    output and the options it was produced with, so the same recording or
+    slide deck uploaded again never goes back to the external APIs.
+    Outputs live in a DiskCache, so the least recently used ones are
+    dropped once the index grows past CONTENT_INDEX_MAX_BYTES.
+    """
+
+    def __init__(self, db_path: str = None, max_bytes: int = None):
+        self.cache = DiskCache(
+            db_path or settings.CONTENT_INDEX_DB_PATH,
+            max_bytes or settings.CONTENT_INDEX_MAX_BYTES,
+            name="content_index",
+        )
+
+    def _key(self, digest: str, kind: str, options: Dict[str, Any] = None) -> str:
+        return f"{kind}:{digest}:{options_key(options)}"
+
+    def get(self, digest: str, kind: str, options: Dict[str, Any] = None) -> Tuple[bool, Any]:
+        """Return (found, output) for a processed upload."""
+        value = self.cache.get(self._key(digest, kind, options))
+        if value is None:
+            return False, None
+        return True, json.loads(value)
+
+    def put(self, digest: str, kind: str, options: Dict[str, Any], output: Any):
+        self.cache.put_json(self._key(digest, kind, options), output)
+
+    async def get_or_compute(self, digest: str, kind: str, options: Dict[str, Any], func: Callable, *args, **kwargs) -> Any:
+        """Return the stored output for this upload, or compute and store it."""
+        return await load_or_compute(
+            lambda: self.get(digest, kind, options),
+            lambda output: self.put(digest, kind, options, output),
+            f"Reusing stored {kind} for upload {digest[:12]}",
+            func, *args, **kwargs
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+content_index = ContentIndex()
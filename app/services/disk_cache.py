@@ -0,0 +1,167 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class DiskCache:
+    """
+    Persistent key/value cache in a local SQLite file with size-based LRU
+    eviction. Values are stored as bytes; once the total size goes over
+    `max_bytes`, the least recently used entries are dropped.
+
+    The total size is kept in a one-row table updated in the same
+    transaction as every write, so a put never has to sum the whole table.
+    Access times of hits are buffered in memory and written in one batch,
+    so a lookup is a single SELECT. `get_many` and `put_many` read and
+    write many keys in one statement and one transaction.
+    Hit and miss counters are kept per process.
+    """
+
+    # Keys per IN (...) query, below SQLite's limit on bound parameters
+    QUERY_BATCH_SIZE = 500
+    # Buffered access times are written once there are this many, or they are this old
+    ACCESS_FLUSH_SIZE = 1000
+    ACCESS_FLUSH_SECONDS = 30.0
+    # Eviction frees down to this share of max_bytes, so a full cache does not evict on every put
+    EVICT_TO = 0.9
+
+    def __init__(self, db_path: str, max_bytes: int, name: str = "cache"):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._accessed: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        # Commits no longer wait for an fsync each, readers do not block the writer
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_access_idx ON entries (last_access)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    size INTEGER NOT NULL
+                )
+            """)
+            # Caches created before the totals table start from the current sum
+            self._conn.execute(
+                "INSERT OR IGNORE INTO totals (id, size) SELECT 0, COALESCE(SUM(size), 0) FROM entries"
+            )
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Values of the cached keys among `keys`; missing keys are left out."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), self.QUERY_BATCH_SIZE):
+                batch = keys[start:start + self.QUERY_BATCH_SIZE]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(rows)
+            now = time.time()
+            for key in found:
+                self._accessed[key] = now
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            if len(self._accessed) >= self.ACCESS_FLUSH_SIZE \
+                    or time.monotonic() - self._flushed_at >= self.ACCESS_FLUSH_SECONDS:
+                with self._conn:
+                    self._flush_accessed()
+        return found
+
+    def put(self, key: str, value: bytes):
+        self.put_many([(key, value)])
+
+    def put_many(self, items: Iterable[Tuple[str, bytes]]):
+        """Store many values in one transaction, evicting once at the end if needed."""
+        items = list(dict(items).items())
+        if not items:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            # Take the write lock first, so the sizes read below are not changed by another process
+            self._conn.execute("BEGIN IMMEDIATE")
+            replaced = 0
+            for start in range(0, len(items), self.QUERY_BATCH_SIZE):
+                batch = [key for key, _ in items[start:start + self.QUERY_BATCH_SIZE]]
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                [(key, value, len(value), now) for key, value in items]
+            )
+            added = sum(len(value) for _, value in items) - replaced
+            self._conn.execute("UPDATE totals SET size = size + ? WHERE id = 0", (added,))
+            total = self._conn.execute("SELECT size FROM totals WHERE id = 0").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(total)
+
+    def get_json(self, key: str) -> Optional[Any]:
+        value = self.get(key)
+        return None if value is None else json.loads(value)
+
+    def put_json(self, key: str, value: Any):
+        self.put(key, json.dumps(value).encode('utf-8'))
+
+    def get_many_json(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return {key: json.loads(value) for key, value in self.get_many(keys).items()}
+
+    def put_many_json(self, items: Iterable[Tuple[str, Any]]):
+        self.put_many((key, json.dumps(value).encode('utf-8')) for key, value in items)
+
+    def _flush_accessed(self):
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE entries SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()]
+            )
+            self._accessed.clear()
+        self._flushed_at = time.monotonic()
+
+    def _evict(self, total: int):
+        # Recent hits must count before picking the least recently used entries
+        self._flush_accessed()
+        evicted: List[Tuple[str]] = []
+        freed = 0
+        target = self.max_bytes * self.EVICT_TO
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            if total - freed <= target:
+                break
+            evicted.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._conn.execute("UPDATE totals SET size = size - ? WHERE id = 0", (freed,))
+        print(f"{self.name} cache: evicted {len(evicted)} entries")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            size = self._conn.execute("SELECT size FROM totals WHERE id = 0").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,67 @@
+from typing import List, Tuple
+
+import PyPDF2
+from pptx import Presentation
+from spire.doc import Document
+
+# Text extractors that run in the process pool. Spawned workers import this
+# module to unpickle them, so it must stay free of settings, databases and
+# clients: nothing beyond the parsers themselves.
+
+
+def count_pdf_pages(file_path: str) -> int:
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """(page number, raw text) of the 0-based pages [start, end), run in a worker process."""
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return [(index + 1, reader.pages[index].extract_text() or "") for index in range(start, end)]
+
+
+def extract_pptx_slides(file_path: str) -> List[str]:
+    """Extract the text of every non-empty slide of a PPTX file."""
+    prs = Presentation(file_path)
+    if len(prs.slides) == 0:
+        raise Exception("No slides found in PPTX")
+
+    text_runs = []
+    for slide in prs.slides:
+        try:
+            slide_text = ""
+            for shape in slide.shapes:
+                if not shape.has_text_frame:
+                    continue
+                for paragraph in shape.text_frame.paragraphs:
+                    for run in paragraph.runs:
+                        slide_text += run.text
+
+            # Only add non-empty slide text
+            if slide_text.strip():
+                text_runs.append(sanitize_text(slide_text))
+        except Exception as slide_error:
+            print(f"Error processing slide: {slide_error}")
+            # Continue with next slide instead of failing completely
+            continue
+    return text_runs
+
+
+def extract_docx_text(file_path: str) -> List[str]:
+    """Extract the text of a DOCX or DOC file, as a single entry since documents have no fixed pages."""
+    doc = Document()
+    doc.LoadFromFile(file_path)
+    try:
+        return [sanitize_text(doc.GetText())]
+    finally:
+        doc.Close()
+
+
+def sanitize_text(text: str) -> str:
+    """Sanitize text by removing unwanted characters."""
+    unwanted_chars = ['\u0000', '\n', '\r']
+
+    for char in unwanted_chars:
+        text = text.replace(char, '')
+    return text
@@ -1,81 +1,158 @@
+import hashlib
+import json
 import os
+import re
+import unicodedata
+from array import array
 from typing import List, Dict
 
 from openai import OpenAI, embeddings
 from supabase import create_client
 
 from ..core.config import settings
+from .disk_cache import DiskCache
+from .lecture_store import live_segments
+from .token_chunker import get_encoding
+from .vector_index import course_index_name, lecture_index_name, parse_embedding, vector_index_store
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# Longest single input the embeddings endpoint accepts
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+# Bulk-update functions (see supabase/migrations) that write embeddings per table
+EMBEDDING_UPDATE_FUNCTIONS = {
+    'segments': 'update_segment_embeddings',
+    'lectures': 'update_lecture_embeddings',
+}
+# Minimum cosine similarity of a search result, the same for the local index and the match_* functions
+MATCH_THRESHOLD = 0.7
+
+# Embedding vectors keyed by model and normalized text digest, stored as float32
+embedding_cache = DiskCache(settings.EMBEDDING_CACHE_DB_PATH, settings.EMBEDDING_CACHE_MAX_BYTES, name="embedding")
+
+
+def normalize_text(text: str) -> str:
+    """Text as it is embedded: NFC-normalized with whitespace collapsed."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def embedding_key(model: str, text: str) -> str:
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def get_cached_embeddings(keys: List[str]) -> Dict[str, List[float]]:
+    """Cached vectors of `keys`, read in one query; missing keys are left out."""
+    return {key: array('f', value).tolist() for key, value in embedding_cache.get_many(keys).items()}
+
+
+def put_cached_embeddings(embeddings: Dict[str, List[float]]):
+    embedding_cache.put_many((key, array('f', embedding).tobytes()) for key, embedding in embeddings.items())
 
 class EmbeddingService:
+    """
+    Embeds lecture summaries and segments. Texts are packed into as few
+    embeddings requests as the token and input limits allow, and the
+    vectors are written back in bulk updates rather than one update per row.
+    Vectors are cached by model and normalized text, so unchanged text is
+    never sent to the API again, and rows whose `embedding_hash` still
+    matches their text are not re-embedded or rewritten at all.
+    """
 
-    def __init__(self):
+    def __init__(self, model: str = EMBEDDING_MODEL):
         self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
         self.SUPABASE_URL = os.getenv("SUPABASE_URL")
         self.SUPABASE_KEY = os.getenv("SUPABASE_KEY")
         self.supabase = create_client(self.SUPABASE_URL, self.SUPABASE_KEY)
+        self.model = model
+        self.encoding = get_encoding(model)
 
     def generate_course_embeddings(self, course_id: int):
         """Generate embeddings for all lectures in a course"""
         # 1. Get all lectures in the course
         lectures = self.supabase.table('lectures').select(
-            'lecture_id, name, summary, segments(id, content)'
+            'lecture_id, summary, embedding_hash'
         ).eq('course_id', course_id).execute()
 
         if not lectures.data:
             raise ValueError(f"No lectures found for course ID {course_id}")
 
-        # 2. Generate embeddings for each lecture of course
-        for lecture in lectures.data:
-            # Generate embedding using OpenAI's API
-            embedding = self._get_embedding(lecture['summary'])
-
-            # Update lecture with embedding in database
-            self.supabase.table('lectures').update({
-                'embedding': embedding
-            }).eq('lecture_id', lecture['lecture_id']).execute()
+        # 2. Embed the summaries that changed since they were last embedded
+        embedded = self._embed_stale_rows('lectures', 'lecture_id', 'summary', lectures.data)
+        if embedded:
+            vector_index_store.invalidate(course_index_name(course_id))
 
-        return f"Generated embeddings for {len(lectures.data)} lectures"
+        return f"Generated embeddings for {embedded} of {len(lectures.data)} lectures"
 
     def generate_embeddings(self, lecture_id: int):
         """Generate embeddings for all segments of a lecture"""
         # 1. Get lecture and its segments
         lecture = self.supabase.table('lectures').select(
-            'lecture_id, name, transcription, segments(id, content)'
+            'lecture_id, name, transcription'
         ).eq('lecture_id', lecture_id).execute()
 
         if not lecture.data:
             raise ValueError(f"No lecture found with ID {lecture_id}")
 
-        lecture_data = lecture.data[0]
-        segments = lecture_data.get('segments', [])
+        segments = live_segments(self.supabase, lecture_id, 'id, content, embedding_hash')
 
-        print('segments:', segments)
+        # 2. Embed the segments that are new or changed since they were last embedded
+        embedded = self._embed_stale_rows('segments', 'id', 'content', segments)
+        if embedded:
+            vector_index_store.invalidate(lecture_index_name(lecture_id))
 
-        # 2. Generate embeddings for each segment
-        for segment in segments:
-            # Generate embedding using OpenAI's API
-            embedding = self._get_embedding(segment['content'])
+        return f"Generated embeddings for {embedded} of {len(segments)} segments"
 
-            # Update segment with embedding in database
-            self.supabase.table('segments').update({
-                'embedding': embedding
-            }).eq('id', segment['id']).execute()
+    def content_hash(self, text: str) -> str:
+        """Hash stored next to an embedding, it changes with the embedded text and with the model."""
+        return embedding_key(self.model, normalize_text(text))
 
-        return f"Generated embeddings for {len(segments)} segments"
+    def _embed_stale_rows(self, table: str, key: str, text_column: str, rows: List[dict]) -> int:
+        """
+        Embed only the rows whose embedding is missing or out of date, that is
+        whose `embedding_hash` differs from the hash of their current text.
+        The embedding and its hash are always written together, so a row
+        without a hash has no embedding yet. Returns the number of rows embedded.
+        """
+        stale = [
+            row for row in rows
+            if row.get(text_column) and row.get('embedding_hash') != self.content_hash(row[text_column])
+        ]
+        if not stale:
+            print(f"Embeddings of all {len(rows)} {table} are up to date")
+            return 0
 
+        embeddings = self._get_embeddings([row[text_column] for row in stale])
+        self._write_embeddings(
+            table,
+            [row[key] for row in stale],
+            embeddings,
+            [self.content_hash(row[text_column]) for row in stale],
+        )
+        return len(stale)
 
     def search_course(self, query: str, course_id: int, top_k: int = 3) -> List[Dict]:
         """Search for relevant lecture segments based on query"""
         # 1. Generate embedding for the query
         query_embedding = self._get_embedding(query)
 
-        # 2. Perform similarity search using Supabase's vector similarity
+        # 2. Search the local index of the course, built from the database on first use
+        if settings.VECTOR_SEARCH == "local":
+            name = course_index_name(course_id)
+            index = vector_index_store.get(name, lambda: self._index_rows(
+                self.supabase.table('lectures').select('lecture_id, embedding').eq('course_id', course_id).execute().data,
+                'lecture_id'
+            ))
+            hits = index.search(query_embedding, top_k, MATCH_THRESHOLD)
+            rows = self.supabase.table('lectures').select('*').eq('course_id', course_id) \
+                .in_('lecture_id', [hit['lecture_id'] for hit in hits]).execute().data if hits else []
+            return self._hydrate(name, 'lecture_id', hits, rows)
+
+        # Or perform similarity search using Supabase's vector similarity
         results = self.supabase.rpc(
             'match_lectures',
             {
                 'query_embedding': query_embedding,
                 'input_course_id': course_id,
-                'match_threshold': 0.7,
+                'match_threshold': MATCH_THRESHOLD,
                 'match_count': top_k
             }
         ).execute()
@@ -88,25 +165,116 @@ class EmbeddingService:
         # 1. Generate embedding for the query
         query_embedding = self._get_embedding(query)
 
-        # 2. Perform similarity search using Supabase's vector similarity
+        # 2. Search the local index of the lecture, built from the database on first use
+        if settings.VECTOR_SEARCH == "local":
+            name = lecture_index_name(lecture_id)
+            index = vector_index_store.get(
+                name, lambda: self._index_rows(live_segments(self.supabase, lecture_id, 'id, embedding'), 'id')
+            )
+            hits = index.search(query_embedding, top_k, MATCH_THRESHOLD)
+            rows = live_segments(self.supabase, lecture_id, '*', ids=[hit['id'] for hit in hits]) if hits else []
+            return self._hydrate(name, 'id', hits, rows)
+
+        # Or perform similarity search using Supabase's vector similarity
         results = self.supabase.rpc(
             'match_segments',
             {
                 'query_embedding': query_embedding,
                 'input_lecture_id': lecture_id,  # Added lecture_id parameter
-                'match_threshold': 0.7,
+                'match_threshold': MATCH_THRESHOLD,
                 'match_count': top_k
             }
         ).execute()
 
         return results.data
 
+    def _index_rows(self, rows: List[dict], key: str):
+        """Embeddings and ids of the rows that have an embedding, for a local index."""
+        embeddings, index_rows = [], []
+        for row in rows:
+            embedding = parse_embedding(row.get('embedding'))
+            if embedding is not None:
+                embeddings.append(embedding)
+                index_rows.append({key: row[key]})
+        return embeddings, index_rows
+
+    def _hydrate(self, name: str, key: str, hits: List[dict], rows: List[dict]) -> List[dict]:
+        """
+        The current rows of the search hits, in hit order, with their
+        similarity. Hits whose row was deleted or is no longer live are left
+        out, and the index is rebuilt on the next search.
+        """
+        rows_by_key = {row[key]: row for row in rows}
+        results = [
+            {
+                **{column: value for column, value in rows_by_key[hit[key]].items() if column != 'embedding'},
+                'similarity': hit['similarity'],
+            }
+            for hit in hits if hit[key] in rows_by_key
+        ]
+        if len(results) < len(hits):
+            print(f"Vector index {name} refers to rows that are no longer live, rebuilding it")
+            vector_index_store.invalidate(name)
+        return results
+
     def _get_embedding(self, text: str) -> List[float]:
         """Generate embedding for a piece of text using OpenAI's API"""
-        response = self.client.embeddings.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
+        return self._get_embeddings([text])[0]
+
+    def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed many texts in as few requests as possible, vectors are returned in input order."""
+        texts = [normalize_text(text) for text in texts]
+        keys = [embedding_key(self.model, text) for text in texts]
+        found = get_cached_embeddings(keys)
+
+        # Embed each missing text once, even if it occurs several times
+        missing = list({key: text for key, text in zip(keys, texts) if key not in found}.items())
+        for batch in self._batches([text for _, text in missing]):
+            response = self.client.embeddings.create(
+                input=[tokens for _, tokens in batch],
+                model=self.model
+            )
+            embedded = {missing[batch[item.index][0]][0]: item.embedding for item in response.data}
+            found.update(embedded)
+            # One transaction per request, so a failure later on keeps what was already paid for
+            put_cached_embeddings(embedded)
+
+        if missing:
+            print(f"Embedded {len(missing)} texts, {len(texts) - len(missing)} served from the embedding cache")
+        return [found[key] for key in keys]
 
-        return response.data[0].embedding
+    def _batches(self, texts: List[str]):
+        """
+        Group texts into requests of at most EMBEDDING_BATCH_SIZE inputs and
+        EMBEDDING_BATCH_TOKENS tokens, counted with tiktoken. Texts are sent
+        as token arrays, cut to the per-input limit of the model.
+        """
+        batch, batch_tokens = [], 0
+        for index, text in enumerate(texts):
+            tokens = self.encoding.encode(text)[:EMBEDDING_MAX_INPUT_TOKENS]
+            if batch and (len(batch) >= settings.EMBEDDING_BATCH_SIZE
+                          or batch_tokens + len(tokens) > settings.EMBEDDING_BATCH_TOKENS):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append((index, tokens))
+            batch_tokens += len(tokens)
+        if batch:
+            yield batch
 
+    def _write_embeddings(self, table: str, ids: List, embeddings: List[List[float]], hashes: List[str]):
+        """
+        Write embeddings and their hashes back in bulk. PostgREST has no bulk
+        update with per-row values, so this goes through a database function
+        that updates only these two columns from unnested arrays; the rest of
+        each row is never read or rewritten.
+        """
+        batch_size = settings.EMBEDDING_WRITE_BATCH_SIZE
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self.supabase.rpc(EMBEDDING_UPDATE_FUNCTIONS[table], {
+                'ids': ids[start:end],
+                # pgvector's text format is a JSON array
+                'embeddings': [json.dumps(embedding) for embedding in embeddings[start:end]],
+                'hashes': hashes[start:end],
+            }).execute()
+        print(f"Wrote {len(ids)} embeddings to {table}")
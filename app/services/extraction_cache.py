@@ -0,0 +1,68 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from .disk_cache import DiskCache
+
+# Bump an extractor's version whenever its output changes, older entries are then ignored
+EXTRACTOR_VERSIONS = {
+    "pdf": 1,
+    "pptx": 1,
+    "docx": 1,
+}
+
+
+class ExtractionCache:
+    """
+    Text extracted from lecture files, keyed by file digest and extractor
+    version, one entry per page (PDF), slide (PPTX) or document (DOCX).
+
+    A file's page count is stored next to its pages, so a file is only
+    served from the cache when every one of its pages is still there; the
+    underlying DiskCache evicts least recently used pages once it is full.
+    """
+
+    def __init__(self, db_path: str = None, max_bytes: int = None):
+        self.cache = DiskCache(
+            db_path or settings.EXTRACTION_CACHE_DB_PATH,
+            max_bytes or settings.EXTRACTION_CACHE_MAX_BYTES,
+            name="extraction",
+        )
+
+    def _key(self, kind: str, digest: str, page: int = None) -> str:
+        key = f"{kind}:v{EXTRACTOR_VERSIONS[kind]}:{digest}"
+        return key if page is None else f"{key}:{page}"
+
+    def page_count(self, kind: str, digest: str) -> Optional[int]:
+        return self.cache.get_json(self._key(kind, digest))
+
+    def set_page_count(self, kind: str, digest: str, page_count: int):
+        self.cache.put_json(self._key(kind, digest), page_count)
+
+    def get_pages(self, kind: str, digest: str, pages: List[int]) -> Optional[List[Tuple[int, str]]]:
+        """(page, text) for every requested page, None if any of them is missing."""
+        keys = [self._key(kind, digest, page) for page in pages]
+        texts = self.cache.get_many_json(keys)
+        if len(texts) < len(set(keys)):
+            return None
+        return [(page, texts[key]) for page, key in zip(pages, keys)]
+
+    def put_pages(self, kind: str, digest: str, pages: List[Tuple[int, str]]):
+        self.cache.put_many_json((self._key(kind, digest, page), text) for page, text in pages)
+
+    def get_document(self, kind: str, digest: str) -> Optional[List[str]]:
+        """Text of every page of a file, None unless all of them are cached."""
+        page_count = self.page_count(kind, digest)
+        if page_count is None:
+            return None
+        pages = self.get_pages(kind, digest, list(range(1, page_count + 1)))
+        return None if pages is None else [text for _, text in pages]
+
+    def put_document(self, kind: str, digest: str, texts: List[str]):
+        self.put_pages(kind, digest, list(enumerate(texts, start=1)))
+        self.set_page_count(kind, digest, len(texts))
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+extraction_cache = ExtractionCache()
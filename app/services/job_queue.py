@@ -0,0 +1,311 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..core.config import settings
+
+JobHandler = Callable[..., Awaitable[Any]]
+JobCleanup = Callable[..., Any]
+
+
+class JobQueueError(Exception):
+    """Custom exception for job queue errors"""
+    pass
+
+
+class JobQueue:
+    """
+    Persistent background job queue backed by a local SQLite database.
+
+    Jobs are stored with their handler name and JSON payload, picked up by a
+    fixed pool of worker tasks, and survive process restarts. Several
+    processes can share the database: a job is claimed with a conditional
+    update, so only one process runs it, and the claiming process records
+    itself as the owner and keeps a heartbeat on the row while it runs. A
+    running job whose heartbeat goes stale belonged to a process that died;
+    it is put back in the queue, or failed once it used up its attempts.
+    Failed jobs are retried up to `max_attempts` times, each retry waiting
+    twice as long as the one before (`run_after`), so a rate limit or an
+    outage of an upstream API does not use up every attempt within seconds.
+
+    All database calls of the workers run in threads, off the event loop.
+    """
+
+    def __init__(self, db_path: str = None, workers: int = None, poll_interval: float = None,
+                 max_attempts: int = None):
+        self.db_path = db_path or settings.JOB_DB_PATH
+        self.workers = workers or settings.JOB_WORKERS
+        self.poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+        self.max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        self.retry_delay = settings.JOB_RETRY_DELAY
+        self.retry_max_delay = settings.JOB_RETRY_MAX_DELAY
+        self.heartbeat_interval = settings.JOB_HEARTBEAT_INTERVAL
+        self.stale_after = settings.JOB_STALE_AFTER
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self.cleanups: Dict[str, JobCleanup] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._worker_tasks: List[asyncio.Task] = []
+        self._monitor_thread: Optional[threading.Thread] = None
+        self._monitor_stop = threading.Event()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._init_db()
+
+    def _init_db(self):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            if "heartbeat_at" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            if "run_after" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN run_after REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, id)")
+
+    def register(self, kind: str, handler: JobHandler, cleanup: JobCleanup = None):
+        """
+        Register the coroutine function that runs jobs of the given kind.
+        `cleanup` is called with the job payload once the job will not run
+        again, i.e. after it completed or failed its last attempt.
+        """
+        self.handlers[kind] = handler
+        if cleanup is not None:
+            self.cleanups[kind] = cleanup
+
+    async def enqueue(self, kind: str, **payload) -> int:
+        """Persist a new job and wake up an idle worker. Returns the job id."""
+        if kind not in self.handlers:
+            raise JobQueueError(f"No handler registered for job kind: {kind}")
+
+        job_id = await asyncio.to_thread(self._insert, kind, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def _insert(self, kind: str, payload: Dict[str, Any]) -> int:
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, payload, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                (kind, json.dumps(payload), now, now)
+            )
+        return cursor.lastrowid
+
+    async def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get_job, job_id)
+
+    def _get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """
+        Move the oldest queued job that is due to 'running' under this process
+        and return it. The update only succeeds while the job is still queued,
+        so when another process claimed it first the next job is tried.
+        """
+        with self._lock:
+            while True:
+                with self._conn:
+                    row = self._conn.execute(
+                        "SELECT id FROM jobs WHERE status = 'queued' AND (run_after IS NULL OR run_after <= ?) "
+                        "ORDER BY id LIMIT 1",
+                        (time.time(),)
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    cursor = self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, heartbeat_at = ?, "
+                        "updated_at = ? WHERE id = ? AND status = 'queued'",
+                        (self.owner, time.time(), datetime.now().isoformat(), row["id"])
+                    )
+                    if cursor.rowcount == 1:
+                        return self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+    def _finish(self, job_id: int, status: str, error: str = None, run_after: float = None) -> bool:
+        """
+        Record the outcome of a job this process still owns, False if it was
+        taken away meanwhile. A job queued again is not claimed before `run_after`.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, run_after = ?, owner = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND owner = ?",
+                (status, error, run_after, datetime.now().isoformat(), job_id, self.owner)
+            )
+        if cursor.rowcount == 0:
+            print(f"Job {job_id} is no longer owned by this process, dropping its {status} result")
+        return cursor.rowcount == 1
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Seconds to wait before retrying a job whose attempt number `attempt` failed."""
+        return min(self.retry_delay * 2 ** (attempt - 1), self.retry_max_delay)
+
+    def _run_cleanup(self, kind: str, payload: Dict[str, Any]):
+        cleanup = self.cleanups.get(kind)
+        if cleanup is None:
+            return
+        try:
+            cleanup(**payload)
+        except Exception as e:
+            print(f"Error cleaning up after {kind} job: {e}")
+
+    def _heartbeat(self):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND owner = ?",
+                (time.time(), self.owner)
+            )
+
+    def _requeue_interrupted(self) -> int:
+        """
+        Recover running jobs whose heartbeat went stale because their process
+        died. They are queued again, or failed (and cleaned up) when they have
+        no attempts left, so a job that crashes its process is not retried forever.
+        """
+        stale_before = time.time() - self.stale_after
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (stale_before,)
+            ).fetchall()
+
+        recovered = 0
+        for row in rows:
+            exhausted = row["attempts"] >= self.max_attempts
+            with self._lock, self._conn:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, owner = NULL, updated_at = ? "
+                    "WHERE id = ? AND status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                    (
+                        "failed" if exhausted else "queued",
+                        "Worker process died while running the job" if exhausted else row["error"],
+                        datetime.now().isoformat(), row["id"], stale_before,
+                    )
+                )
+            if cursor.rowcount == 0:
+                continue
+            recovered += 1
+            if exhausted:
+                print(f"Job {row['id']} ({row['kind']}) failed: its worker died on the last attempt")
+                self._run_cleanup(row["kind"], json.loads(row["payload"]))
+        return recovered
+
+    def _release_owned(self):
+        """Put the jobs this process was running back in the queue on shutdown, without using up an attempt."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), owner = NULL, updated_at = ? "
+                "WHERE status = 'running' AND owner = ?",
+                (datetime.now().isoformat(), self.owner)
+            )
+
+    def _monitor(self, loop: asyncio.AbstractEventLoop):
+        """
+        Keep the heartbeat of this process's jobs fresh and recover jobs of
+        dead processes. Runs in a thread, so a handler that blocks the event
+        loop for a while does not make its own job look abandoned.
+        """
+        while not self._monitor_stop.wait(self.heartbeat_interval):
+            try:
+                self._heartbeat()
+                requeued = self._requeue_interrupted()
+                if requeued:
+                    print(f"Recovered {requeued} interrupted jobs")
+                    loop.call_soon_threadsafe(self._wakeup.set)
+            except sqlite3.Error as e:
+                print(f"Error updating job heartbeats: {e}")
+
+    async def _worker(self, worker_id: int):
+        while True:
+            row = await asyncio.to_thread(self._claim_next)
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, kind = row["id"], row["kind"]
+            handler = self.handlers.get(kind)
+            if handler is None:
+                await asyncio.to_thread(self._finish, job_id, "failed", f"No handler registered for job kind: {kind}")
+                continue
+
+            payload = json.loads(row["payload"])
+            attempt = row["attempts"]
+            print(f"Worker {worker_id} running job {job_id} ({kind}), attempt {attempt}")
+            try:
+                await handler(**payload)
+                if await asyncio.to_thread(self._finish, job_id, "completed"):
+                    self._run_cleanup(kind, payload)
+                    print(f"Job {job_id} ({kind}) completed")
+            except asyncio.CancelledError:
+                # Left as 'running', stop() puts it back in the queue
+                raise
+            except Exception as e:
+                if attempt < self.max_attempts:
+                    delay = self._retry_delay(attempt)
+                    if await asyncio.to_thread(self._finish, job_id, "queued", str(e), time.time() + delay):
+                        print(f"Job {job_id} ({kind}) failed, retrying in {delay:.0f}s: {e}")
+                elif await asyncio.to_thread(self._finish, job_id, "failed", str(e)):
+                    self._run_cleanup(kind, payload)
+                    print(f"Job {job_id} ({kind}) failed: {e}")
+
+    async def start(self):
+        """Recover interrupted jobs and start the worker pool."""
+        if self._worker_tasks:
+            return
+        self._wakeup = asyncio.Event()
+        requeued = await asyncio.to_thread(self._requeue_interrupted)
+        if requeued:
+            print(f"Requeued {requeued} interrupted jobs")
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        self._monitor_stop.clear()
+        self._monitor_thread = threading.Thread(
+            target=self._monitor, args=(asyncio.get_running_loop(),), name="job-queue-monitor", daemon=True
+        )
+        self._monitor_thread.start()
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self._monitor_thread is not None:
+            self._monitor_stop.set()
+            await asyncio.to_thread(self._monitor_thread.join)
+            self._monitor_thread = None
+        await asyncio.to_thread(self._release_owned)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,173 @@
+import os
+from typing import Dict, List, Optional
+
+from supabase import create_client
+
+from .vector_index import course_index_name, lecture_index_name, vector_index_store
+
+
+class LectureStoreError(Exception):
+    """Custom exception for lecture persistence errors"""
+    pass
+
+
+def resource_row(resource: dict, with_view_count: bool = True) -> dict:
+    """Map a YouTubeService result to a resources/segment_resources row."""
+    row = {
+        "title": resource["title"],
+        "url": resource["url"],
+        "description": resource["description"],
+        "thumbnail": resource["thumbnail"],
+        "channel_name": resource["channel_name"],
+        "published_at": resource["published_at"],
+    }
+    if with_view_count:
+        row["viewCount"] = resource["viewCount"]
+    return row
+
+
+def current_version(supabase, lecture_id: int) -> Optional[int]:
+    """Version of the lecture artifacts readers should see, None for unversioned lectures."""
+    response = supabase.table("lectures").select("current_version").eq("lecture_id", lecture_id).execute()
+    if not response.data:
+        return None
+    return response.data[0].get("current_version")
+
+
+def live_segments(supabase, lecture_id: int, columns: str, ids: List[int] = None) -> List[dict]:
+    """
+    Select the segments of the live version of a lecture, or only those of
+    them with the given `ids`. Lectures that were never published under a
+    version only show their unversioned rows, not the rows a reprocess is
+    still writing.
+    """
+    query = supabase.table("segments").select(columns).eq("lecture_id", lecture_id)
+    if ids is not None:
+        query = query.in_("id", ids)
+    version = current_version(supabase, lecture_id)
+    if version is None:
+        query = query.is_("version", "null")
+    else:
+        query = query.eq("version", version)
+    return query.execute().data
+
+
+class LectureStore:
+    """
+    Batched, versioned writes of lecture artifacts.
+
+    Every method issues a constant number of requests regardless of the
+    number of rows, so ingest latency does not grow with the size of the
+    lecture. Reprocessing writes segments and resources under a new version
+    that only becomes visible when `publish_version` flips
+    `lectures.current_version`; older versions are deleted afterwards.
+    Versions are allocated atomically and only ever go up, so concurrent
+    jobs for the same lecture write under different versions and the newest
+    one wins.
+    """
+
+    def __init__(self):
+        self.SUPABASE_URL = os.getenv("SUPABASE_URL")
+        self.SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+        self.supabase = create_client(self.SUPABASE_URL, self.SUPABASE_KEY)
+
+    def current_version(self, lecture_id: int) -> Optional[int]:
+        return current_version(self.supabase, lecture_id)
+
+    def begin_version(self, lecture_id: int) -> int:
+        """
+        Allocate the version number new artifacts should be written under.
+        The allocate_lecture_version function increments a per-lecture
+        counter in one statement, so every call gets a number no other job
+        has, published, failed or still running.
+        """
+        response = self.supabase.rpc("allocate_lecture_version", {"target_lecture_id": lecture_id}).execute()
+        if response.data is None:
+            raise LectureStoreError(f"Lecture {lecture_id} not found, cannot allocate a version")
+        return int(response.data)
+
+    def is_superseded(self, lecture_id: int, version: int) -> bool:
+        """Whether the live version is already this one or a newer one."""
+        return version <= (self.current_version(lecture_id) or 0)
+
+    def publish_version(self, lecture_id: int, version: int, lecture_fields: dict = None) -> bool:
+        """
+        Make a version live, together with its lecture-level fields, in one
+        update. Nothing is changed, and False returned, if a newer version
+        went live in the meantime. The local search indexes of the lecture
+        and its course are dropped, they refer to the previous version.
+        """
+        response = self.supabase.table("lectures").update({
+            **(lecture_fields or {}),
+            "current_version": version,
+        }).eq("lecture_id", lecture_id) \
+            .or_(f"current_version.is.null,current_version.lt.{version}").execute()
+        if not response.data:
+            return False
+        self.invalidate_search_indexes(lecture_id, response.data[0].get("course_id"))
+        return True
+
+    def invalidate_search_indexes(self, lecture_id: int, course_id: int = None):
+        vector_index_store.invalidate(lecture_index_name(lecture_id))
+        if course_id is not None:
+            vector_index_store.invalidate(course_index_name(course_id))
+
+    def discard_version(self, lecture_id: int, version: int):
+        """
+        Delete the artifacts of a version that will never go live. Versions
+        are never shared between jobs, so these rows belong to the caller.
+        """
+        self._delete_artifacts(lecture_id, only_version=version)
+
+    def clear_lecture_artifacts(self, lecture_id: int, keep_version: int = None):
+        """
+        Delete the segments, segment resources and resources of a lecture in
+        one transaction. With `keep_version`, only unversioned rows and older
+        versions are deleted; newer versions belong to jobs still running.
+        """
+        self._delete_artifacts(lecture_id, keep_version=keep_version)
+        if keep_version is None:
+            self.invalidate_search_indexes(lecture_id)
+
+    def _delete_artifacts(self, lecture_id: int, keep_version: int = None, only_version: int = None):
+        # One database function, so the deletes of all three tables commit or fail together
+        self.supabase.rpc("clear_lecture_artifacts", {
+            "target_lecture_id": lecture_id,
+            "keep_version": keep_version,
+            "only_version": only_version,
+        }).execute()
+
+    def insert_segments(self, segments: List[dict]) -> List[int]:
+        """Insert all segment rows at once and return their ids in input order."""
+        if not segments:
+            return []
+        response = self.supabase.table("segments").insert(segments).execute()
+        if len(response.data) != len(segments):
+            raise LectureStoreError(
+                f"Inserted {len(segments)} segments but got {len(response.data)} rows back"
+            )
+        # PostgREST returns the inserted rows in the order they were sent
+        return [row['id'] for row in response.data]
+
+    def insert_segment_resources(self, resources_by_segment: Dict[int, List[dict]]):
+        """Insert the YouTube resources of every segment in one request."""
+        rows = [
+            {"segment_id": segment_id, **resource_row(resource)}
+            for segment_id, resources in resources_by_segment.items()
+            for resource in resources
+        ]
+        if rows:
+            self.supabase.table("segment_resources").insert(rows).execute()
+
+    def insert_resources(self, lecture_id: int, resources: List[dict], version: int = None,
+                         with_view_count: bool = False):
+        """Insert the lecture-level YouTube resources in one request."""
+        rows = [
+            {"lecture_id": lecture_id, **resource_row(resource, with_view_count)}
+            for resource in resources
+        ]
+        if version is not None:
+            for row in rows:
+                row["version"] = version
+        if rows:
+            self.supabase.table("resources").insert(rows).execute()
@@ -1,6 +1,7 @@
 from openai import AsyncOpenAI
 
 from app.core.config import settings
+from app.services.transcript_encoder import TranscriptEncoder
 from datetime import datetime
 from enum import Enum
 from typing import Optional, List, Dict, Any
@@ -81,8 +82,11 @@ class AnalysisResult(BaseModel):
 class LiveDataFormating:
     def __init__(self):
         self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.encoder = TranscriptEncoder(model="gpt-4o-mini")
 
     async def format_data(self, data:AnalyzeLiveMediaRequest):
+        sentences = self.encoder.encode_sentences(data.sentences)
+        print('sentence tokens:', self.encoder.token_report(data, sentences))
 
         prompt = f"""
             You are give list of sentences with start and end time, text of sentence and notes.
@@ -128,8 +132,8 @@ class LiveDataFormating:
           ]
         }}
 
-        Sentences:
-        {data}
+        Sentences ([start - end] text, followed by the notes taken on that sentence):
+        {sentences}
         """
 
         response = await self.client.beta.chat.completions.parse(
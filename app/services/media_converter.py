@@ -1,12 +1,25 @@
 import os
+import time
+import mimetypes
+import tempfile
 from io import BytesIO
 
-import moviepy as mp
-from pathlib import Path
 from fastapi import UploadFile
-import aiofiles
+from pydantic import BaseModel
 from supabase import create_client
 from ..core.config import settings
+from .upload_sink import save_upload
+from .audio_splitter import AudioSplitterError
+from .audio_extractor import audio_extractor
+
+
+class NormalizedAudio(BaseModel):
+    file_path: str
+    mimetype: str
+    original_bytes: int
+    normalized_bytes: int
+    seconds: float
+    is_temporary: bool
 
 
 class MediaConverter:
@@ -17,21 +30,75 @@ class MediaConverter:
         self.supabase = create_client(self.SUPABASE_URL, self.SUPABASE_KEY)
 
     async def save_upload_file(self, upload_file: UploadFile) -> str:
-        upload_folder = Path(settings.UPLOAD_FOLDER)
-        upload_folder.mkdir(exist_ok=True)
+        upload = await save_upload(upload_file, dest_dir=settings.UPLOAD_FOLDER)
+        return upload.file_path
+
+    async def normalize_audio(self, media_path: str) -> NormalizedAudio:
+        """
+        Extract the audio track of an upload and downmix it to a compact mono
+        16 kHz speech encoding (Opus, or MP3 if this ffmpeg build has no Opus
+        encoder) in an ffmpeg subprocess, so video frames and stereo
+        high-bitrate audio never get uploaded to the ASR backend.
+        """
+        original_bytes = os.path.getsize(media_path)
+        if not settings.AUDIO_NORMALIZATION:
+            return NormalizedAudio(
+                file_path=media_path,
+                mimetype=mimetypes.guess_type(media_path)[0] or 'audio/mp3',
+                original_bytes=original_bytes,
+                normalized_bytes=original_bytes,
+                seconds=0.0,
+                is_temporary=False,
+            )
+
+        started = time.perf_counter()
+        encodings = [
+            ('.ogg', 'audio/ogg', ['-c:a', 'libopus', '-application', 'voip']),
+            ('.mp3', 'audio/mp3', ['-c:a', 'libmp3lame']),
+        ]
+        for suffix, mimetype, codec_args in encodings:
+            fd, out_path = tempfile.mkstemp(suffix=suffix, dir=settings.TEMP_UPLOAD_DIR)
+            os.close(fd)
+            try:
+                # Bitexact output (no random Ogg stream serial, no encoder tag) so the same
+                # upload always normalizes to the same bytes and hits the transcription cache
+                await audio_extractor.run_ffmpeg(
+                    '-y', '-i', media_path, '-vn', '-ac', '1', '-ar', '16000',
+                    *codec_args, '-b:a', settings.NORMALIZED_AUDIO_BITRATE,
+                    '-fflags', '+bitexact', '-flags:a', '+bitexact', out_path,
+                )
+                break
+            except AudioSplitterError as e:
+                os.remove(out_path)
+                if suffix == encodings[-1][0]:
+                    raise
+                print(f"Falling back from {mimetype}: {e}")
+
+        normalized = NormalizedAudio(
+            file_path=out_path,
+            mimetype=mimetype,
+            original_bytes=original_bytes,
+            normalized_bytes=os.path.getsize(out_path),
+            seconds=time.perf_counter() - started,
+            is_temporary=True,
+        )
+        print(
+            f"Normalized audio {original_bytes} -> {normalized.normalized_bytes} bytes "
+            f"({original_bytes / max(normalized.normalized_bytes, 1):.1f}x smaller) in {normalized.seconds:.1f}s"
+        )
+        return normalized
 
-        file_path = upload_folder / upload_file.filename
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await upload_file.read()
-            await out_file.write(content)
-        return str(file_path)
+    def discard_normalized(self, audio: NormalizedAudio):
+        if audio.is_temporary and os.path.exists(audio.file_path):
+            os.remove(audio.file_path)
 
     async def convert_video_to_audio(self, video_path: str) -> str:
-        video = mp.VideoFileClip(video_path)
-        audio_path = video_path.rsplit(".", 1)[0] + ".mp3"
-        video.audio.write_audiofile(audio_path)
-        video.close()
-        return audio_path
+        """
+        Extract the audio track of a video. The track is stream-copied when
+        its codec allows, so the extension of the returned path follows the
+        codec (.m4a for AAC, ...), and is transcoded to mp3 otherwise.
+        """
+        return await audio_extractor.extract(video_path)
 
     # async def fetch_file_from_supabase(self, bucket_name: str, file_path: str) -> str:
     #     """Downloads file from Supabase and saves locally with a fixed name."""
@@ -0,0 +1,38 @@
+import hashlib
+import inspect
+import json
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def file_digest(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def options_key(options: Optional[Dict[str, Any]]) -> str:
+    """Stable hash of a pipeline options dict."""
+    encoded = json.dumps(options or {}, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+async def load_or_compute(load: Callable[[], Tuple[bool, Any]], save: Callable[[Any], None], reused: str,
+                          func: Callable, *args, **kwargs) -> Any:
+    """
+    Return the output `load` finds (printing `reused`), or call `func` and
+    `save` its output. `func` may be a plain function or a coroutine
+    function and must return something JSON-serializable.
+    """
+    found, output = load()
+    if found:
+        print(reused)
+        return output
+
+    output = func(*args, **kwargs)
+    if inspect.isawaitable(output):
+        output = await output
+    save(output)
+    return output
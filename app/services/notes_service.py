@@ -5,23 +5,28 @@ from pydantic import BaseModel, ConfigDict
 from supabase import create_client
 
 from app.core.config import settings
+from app.services.lecture_store import live_segments
 
 
 class NotesResponse(BaseModel):
     notes: str
 
 class NotesGeneration:
-    def __init__(self, lecture_id: int):
+    def __init__(self, lecture_id: int, version: int = None):
         self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
         self.SUPABASE_URL = os.getenv("SUPABASE_URL")
         self.SUPABASE_KEY = os.getenv("SUPABASE_KEY")
         self.supabase = create_client(self.SUPABASE_URL, self.SUPABASE_KEY)
         self.lecture_id = lecture_id
+        self.version = version
     
     def get_segments(self) -> List[Dict[str, Any]]:
+        """Segments of the given version, or of the live version if none was given."""
+        if self.version is None:
+            return live_segments(self.supabase, self.lecture_id, 'id, content')
         segments = self.supabase.table('segments').select(
             'id, content'
-        ).eq('lecture_id', self.lecture_id).execute()
+        ).eq('lecture_id', self.lecture_id).eq('version', self.version).execute()
         return segments.data
     
     async def generate_notes(self) -> List[Dict[str, Any]]:
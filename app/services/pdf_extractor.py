@@ -0,0 +1,99 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
+
+from ..core.config import settings
+from .document_text import count_pdf_pages, extract_pdf_pages
+from .extraction_cache import extraction_cache
+from .memo import file_digest
+from .process_pool import process_pool
+from .token_chunker import get_encoding
+
+
+class PdfParagraph(NamedTuple):
+    page: int  # 1-based page number
+    text: str
+
+
+def page_paragraphs(page: int, text: str) -> List[PdfParagraph]:
+    """Split a page at blank lines, then drop the line breaks like sanitize_text does."""
+    paragraphs = []
+    for block in text.split('\n\n'):
+        block = block.replace('\u0000', '').replace('\n', '').replace('\r', '').strip()
+        if block:
+            paragraphs.append(PdfParagraph(page, block))
+    return paragraphs
+
+
+class PdfExtractor:
+    """
+    Extracts the text of a PDF in page ranges of PDF_PAGES_PER_TASK, parsed
+    in parallel in the process pool, and yields it paragraph by paragraph
+    in page order as soon as each range is ready.
+
+    With a token budget, extraction stops once the paragraphs yielded so far
+    reach it and no further ranges are submitted. Ranges already in flight
+    are left to finish, cancelling them would recycle the shared pool.
+
+    Page texts are cached by file digest, so a range whose pages were all
+    extracted before is not parsed again.
+    """
+
+    def __init__(self, pages_per_task: int = None, model: str = "gpt-4o-mini"):
+        self.pages_per_task = pages_per_task or settings.PDF_PAGES_PER_TASK
+        self.encoding = get_encoding(model)
+
+    async def paragraphs(self, file_path: str, token_budget: Optional[int] = None,
+                         digest: str = None) -> AsyncIterator[PdfParagraph]:
+        token_budget = token_budget or settings.PDF_EXTRACTION_TOKEN_BUDGET
+        digest = digest or await asyncio.to_thread(file_digest, file_path)
+        total_pages = extraction_cache.page_count("pdf", digest)
+        if total_pages is None:
+            total_pages = await process_pool.run("pdf", count_pdf_pages, file_path)
+            extraction_cache.set_page_count("pdf", digest, total_pages)
+        ranges = deque(
+            (start, min(start + self.pages_per_task, total_pages))
+            for start in range(0, total_pages, self.pages_per_task)
+        )
+        in_flight = settings.PROCESS_POOL_LIMITS.get("pdf", settings.PROCESS_POOL_WORKERS)
+        print(f"Extracting {total_pages} PDF pages from {file_path} in {len(ranges)} ranges")
+
+        pending: deque = deque()
+
+        def submit():
+            while ranges and len(pending) < in_flight:
+                start, end = ranges.popleft()
+                pending.append(asyncio.create_task(self._pages(file_path, digest, start, end)))
+
+        tokens = 0
+        try:
+            submit()
+            while pending:
+                pages = await pending.popleft()
+                submit()
+                for page, text in pages:
+                    for paragraph in page_paragraphs(page, text):
+                        yield paragraph
+                        tokens += len(self.encoding.encode(paragraph.text))
+                        if token_budget and tokens >= token_budget:
+                            print(f"PDF token budget of {token_budget} reached at page {page} of {total_pages}")
+                            return
+        finally:
+            for task in pending:
+                # Nobody awaits these any more, keep their errors out of the "never retrieved" log
+                task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    async def _pages(self, file_path: str, digest: str, start: int, end: int) -> List[Tuple[int, str]]:
+        pages = extraction_cache.get_pages("pdf", digest, list(range(start + 1, end + 1)))
+        if pages is None:
+            pages = await process_pool.run("pdf", extract_pdf_pages, file_path, start, end)
+            extraction_cache.put_pages("pdf", digest, pages)
+        return pages
+
+    async def extract_text(self, file_path: str, token_budget: Optional[int] = None, digest: str = None) -> str:
+        """The paragraphs of a PDF joined with blank lines, the text the lecture analysis expects."""
+        paragraphs = [paragraph.text async for paragraph in self.paragraphs(file_path, token_budget, digest)]
+        return "\n\n".join(paragraphs)
+
+
+pdf_extractor = PdfExtractor()
@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from ..core.config import settings
+
+
+class ProcessPoolTimeout(Exception):
+    """Raised when a task in the process pool runs longer than its timeout"""
+    pass
+
+
+class ProcessPoolService:
+    """
+    Shared process pool for CPU-bound parsing (PDF, PPTX, DOCX, ...), so it
+    never runs on the event loop of the API worker.
+
+    Every task has a kind with its own concurrency limit and a timeout. A
+    process cannot be interrupted half way through a task, so when a running
+    task times out or is cancelled the pool is recycled, which kills its
+    worker; other tasks that were running in that pool are resubmitted once.
+    """
+
+    def __init__(self, max_workers: int = None, limits: Dict[str, int] = None, timeout: float = None):
+        self.max_workers = max_workers or settings.PROCESS_POOL_WORKERS
+        self.limits = limits or settings.PROCESS_POOL_LIMITS
+        self.timeout = timeout or settings.PROCESS_POOL_TIMEOUT
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the API process runs threads (SQLite, httpx) that fork does not copy safely
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """Kill the workers of a pool and start a new one on the next task."""
+        if executor is self._executor:
+            self._executor = None
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _semaphore(self, kind: str) -> asyncio.Semaphore:
+        if kind not in self._semaphores:
+            self._semaphores[kind] = asyncio.Semaphore(self.limits.get(kind, self.max_workers))
+        return self._semaphores[kind]
+
+    async def run(self, kind: str, func: Callable, *args, timeout: float = None) -> Any:
+        """
+        Run a picklable, module-level function in the pool and await its result.
+        Workers import the function's module, so keep it light (see document_text).
+        """
+        timeout = timeout or self.timeout
+
+        async with self._semaphore(kind):
+            for attempt in range(2):
+                executor = self._get_executor()
+                future = executor.submit(func, *args)
+                try:
+                    return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+                except BrokenProcessPool:
+                    if attempt:
+                        raise
+                    print(f"Process pool was recycled while running a {kind} task, resubmitting")
+                    if executor is self._executor:
+                        self._recycle(executor)
+                except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                    # A task that has not started yet can simply be dropped
+                    if not future.cancel():
+                        self._recycle(executor)
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise ProcessPoolTimeout(f"{kind} task did not finish within {timeout}s")
+                    raise
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+process_pool = ProcessPoolService()
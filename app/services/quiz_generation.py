@@ -5,6 +5,7 @@ from litellm import completion, acompletion
 from pydantic import BaseModel
 from supabase import create_client
 from app.core.config import settings
+from app.services.lecture_store import live_segments
 
 
 class Quiz(BaseModel):
@@ -64,16 +65,10 @@ class QuizGeneration:
         self.lecture_id = lecture_id
 
     def get_segments(self) -> List[Dict[str, Any]]:
-        segments = self.supabase.table('segments').select(
-            'id, content'
-        ).eq('lecture_id', self.lecture_id).execute()
-        return segments.data
+        return live_segments(self.supabase, self.lecture_id, 'id, content')
     
     def get_notes(self) -> List[Dict[str, Any]]:
-        segments = self.supabase.table('segments').select(
-            'id, segment_notes'
-        ).eq('lecture_id', self.lecture_id).execute()
-        return segments.data
+        return live_segments(self.supabase, self.lecture_id, 'id, segment_notes')
 
     async def generate_quiz(self, difficulty: str) -> List[Dict[str, Any]]:
         segments = self.get_notes()
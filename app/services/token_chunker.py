@@ -0,0 +1,86 @@
+from typing import Any, Callable, Dict, List
+
+import tiktoken
+
+from ..core.config import settings
+
+
+def get_encoding(model: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+class TokenBudgetChunker:
+    """
+    Packs transcript paragraphs into chunks by token count instead of by time.
+
+    A chunk is closed before it would exceed either the prompt budget or,
+    using `output_ratio` as the expected translation size, the output budget.
+    Chunks are only ever cut at paragraph boundaries; a single paragraph that
+    is larger than the budget gets a chunk of its own.
+    """
+
+    def __init__(self, model: str = "gpt-4o-mini", input_budget: int = None, output_budget: int = None,
+                 output_ratio: float = None, render: Callable[[dict], str] = str):
+        self.input_budget = input_budget or settings.CHUNK_INPUT_TOKEN_BUDGET
+        self.output_budget = output_budget or settings.CHUNK_OUTPUT_TOKEN_BUDGET
+        self.output_ratio = output_ratio or settings.CHUNK_OUTPUT_RATIO
+        self.render = render
+        self.encoding = get_encoding(model)
+
+    @property
+    def token_budget(self) -> int:
+        """Prompt tokens per chunk that keep both the input and the expected output within budget."""
+        return min(self.input_budget, int(self.output_budget / self.output_ratio))
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def chunk(self, paragraphs: List[dict]) -> List[Dict[str, Any]]:
+        paragraphs_sorted = sorted(paragraphs, key=lambda p: p["paragraph_start"])
+        budget = self.token_budget
+
+        chunks = []
+        current_chunk = []
+        current_tokens = 0
+
+        for para in paragraphs_sorted:
+            tokens = self.count_tokens(self.render(para))
+            if current_chunk and current_tokens + tokens > budget:
+                chunks.append(self._make_chunk(current_chunk, current_tokens))
+                current_chunk, current_tokens = [], 0
+            current_chunk.append(para)
+            current_tokens += tokens
+
+        # handle any leftover paragraphs
+        if current_chunk:
+            chunks.append(self._make_chunk(current_chunk, current_tokens))
+
+        return chunks
+
+    def _make_chunk(self, paragraphs: List[dict], tokens: int) -> Dict[str, Any]:
+        return {
+            "start_time": paragraphs[0]["paragraph_start"],
+            "end_time": paragraphs[-1]["paragraph_end"],
+            "paragraphs": paragraphs,
+            "input_tokens": tokens,
+            "estimated_output_tokens": int(tokens * self.output_ratio),
+        }
+
+    def stats(self, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Chunk size and token statistics, for tuning the budgets."""
+        tokens = [chunk["input_tokens"] for chunk in chunks]
+        durations = [chunk["end_time"] - chunk["start_time"] for chunk in chunks]
+        return {
+            "chunks": len(chunks),
+            "token_budget": self.token_budget,
+            "total_input_tokens": sum(tokens),
+            "min_input_tokens": min(tokens, default=0),
+            "max_input_tokens": max(tokens, default=0),
+            "mean_input_tokens": sum(tokens) / len(tokens) if tokens else 0,
+            "estimated_output_tokens": sum(chunk["estimated_output_tokens"] for chunk in chunks),
+            "over_budget_chunks": sum(1 for t in tokens if t > self.token_budget),
+            "mean_duration": sum(durations) / len(durations) if durations else 0,
+        }
@@ -0,0 +1,68 @@
+from datetime import datetime
+from typing import Any, Dict, List, Union
+
+from .token_chunker import get_encoding
+
+Timestamp = Union[float, int, datetime, None]
+
+
+def format_time(value: Timestamp) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return f"{value:.2f}".rstrip('0').rstrip('.')
+
+
+class TranscriptEncoder:
+    """
+    Compact line encoding of transcripts for LLM prompts.
+
+    Instead of the Python repr of nested dicts, every paragraph (or sentence)
+    becomes one `[start-end] text` line, which removes the repeated keys and
+    quoting from the prompt.
+    """
+
+    def __init__(self, model: str = "gpt-4o-mini", merge_sentences: bool = True):
+        self.merge_sentences = merge_sentences
+        self.encoding = get_encoding(model)
+
+    def line(self, start: Timestamp, end: Timestamp, text: str) -> str:
+        # datetimes contain '-', so they get spaces around the separator
+        separator = " - " if isinstance(start, datetime) else "-"
+        return f"[{format_time(start)}{separator}{format_time(end)}] {text.strip()}"
+
+    def encode_paragraph(self, paragraph: Dict[str, Any]) -> str:
+        """One line per paragraph, or one per sentence if sentences are not merged."""
+        sentences = paragraph.get("sentences", [])
+        if self.merge_sentences:
+            text = " ".join(sentence["text"].strip() for sentence in sentences)
+            return self.line(paragraph["paragraph_start"], paragraph["paragraph_end"], text)
+        return "\n".join(
+            self.line(sentence["start"], sentence["end"], sentence["text"]) for sentence in sentences
+        )
+
+    def encode_paragraphs(self, paragraphs: List[Dict[str, Any]]) -> str:
+        return "\n".join(self.encode_paragraph(paragraph) for paragraph in paragraphs)
+
+    def encode_sentences(self, sentences: List[Any]) -> str:
+        """Encode live TranscribedSentence objects, with their notes on indented lines."""
+        lines = []
+        for sentence in sentences:
+            lines.append(self.line(sentence.startTime, sentence.endTime, sentence.text))
+            for note in sentence.notes:
+                lines.append(f"  note ({note.type.value}): {note.content}")
+        return "\n".join(lines)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def token_report(self, original: Any, encoded: str) -> Dict[str, Any]:
+        """Token count of the repr that used to be sent against the compact encoding."""
+        before = self.count_tokens(str(original))
+        after = self.count_tokens(encoded)
+        return {
+            "tokens_before": before,
+            "tokens_after": after,
+            "reduction": 1 - after / before if before else 0.0,
+        }
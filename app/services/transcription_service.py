@@ -1,54 +1,214 @@
-from typing import Dict, Any
+import asyncio
+import os
+from typing import Dict, Any, AsyncIterator, List, Optional
 
+import aiofiles
 import httpx
-from deepgram import (
-    DeepgramClient,
-)
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential
 from ..core.config import settings
+from .audio_splitter import AudioWindow, extract_window, probe_duration, windows_at_silences
+from .memo import file_digest, options_key
+from .disk_cache import DiskCache
+
+DEEPGRAM_LISTEN_URL = "https://api.deepgram.com/v1/listen"
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Raw Deepgram responses keyed by audio digest and request options
+transcription_cache = DiskCache(
+    settings.TRANSCRIPTION_CACHE_DB_PATH, settings.TRANSCRIPTION_CACHE_MAX_BYTES, name="transcription"
+)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Connection-pooled client shared by every transcription in this process."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(300.0, connect=10.0),
+            limits=httpx.Limits(max_connections=settings.TRANSCRIPTION_CONCURRENCY * 2),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 class TranscriptionService:
     def __init__(self):
-        self.dg_client = DeepgramClient(settings.DEEPGRAM_API_KEY)
-
-    async def transcribe_audio(self, audio_path: str) -> dict[str, Any]:
-        with open(audio_path, 'rb') as audio:
-            source = {'buffer': audio, 'mimetype': 'audio/mp3'}
-            response = self.dg_client.listen.rest.v("1").transcribe_file(
-                source,
-                {
-                    'language': 'hi',
-                    'smart_format': True,
-                    'model': 'nova-2',
-                    'punctuate': True,
-                    'summarize': True,
-                    'paragraphs': True,
-                    'utterances': True,
-                },
-                timeout=httpx.Timeout(300.0, connect=10.0)
-            )
-
-            paragraphs_data = response['results']['channels'][0]['alternatives'][0]['paragraphs']['paragraphs']
-
-            # Create a list of paragraphs and their sentences
-            paragraphs_list = [
-                {
-                    "paragraph_start": paragraph["start"],
-                    "paragraph_end": paragraph["end"],
-                    "sentences": [
-                        {
-                            "text": sentence["text"],
-                            "start": sentence["start"],
-                            "end": sentence["end"]
-                        }
-                        for sentence in paragraph["sentences"]
-                    ]
-                }
-                for paragraph in paragraphs_data
+        self.api_key = settings.DEEPGRAM_API_KEY
+        self.options = {
+            'language': 'hi',
+            'smart_format': True,
+            'model': 'nova-2',
+            'punctuate': True,
+            'summarize': True,
+            'paragraphs': True,
+            'utterances': True,
+        }
+
+    async def transcribe_audio(self, audio_path: str, mimetype: str = 'audio/mp3') -> dict[str, Any]:
+        response = await self._transcribe_file(audio_path, mimetype)
+        return self._parse_response(response)
+
+    async def transcribe_windowed(self, audio_path: str, window_seconds: float = None) -> dict[str, Any]:
+        """
+        Transcribe a long recording as overlapping windows that are sent to
+        Deepgram concurrently, and stitch them back into one transcription
+        with absolute timestamps. A failed window is retried on its own.
+        """
+        windows = [window async for window in self.transcribe_windows(audio_path, window_seconds)]
+        summaries = [window["summary"] for window in windows]
+        return {
+            'transcript': " ".join(window["transcript"] for window in windows),
+            'summary': summaries[0] if len(summaries) == 1 else summaries,
+            'paragraphs': [paragraph for window in windows for paragraph in window["paragraphs"]]
+        }
+
+    async def transcribe_windows(self, audio_path: str, window_seconds: float = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Transcribe a recording window by window, yielding each window's
+        transcription in order as soon as it is ready so that downstream
+        analysis can start while the later windows are still being transcribed.
+        Up to TRANSCRIPTION_CONCURRENCY windows are transcribed at once.
+        Paragraph and sentence timestamps are absolute.
+        """
+        window_seconds = window_seconds or settings.TRANSCRIPTION_WINDOW_SECONDS
+        duration = await probe_duration(audio_path)
+        semaphore = asyncio.Semaphore(settings.TRANSCRIPTION_CONCURRENCY)
+        # Windows are planned one cut at a time, each starts transcribing as soon as it is planned
+        planned: asyncio.Queue = asyncio.Queue()
+
+        async def transcribe(window: AudioWindow):
+            async with semaphore:
+                return await self._transcribe_window(audio_path, window)
+
+        async def plan():
+            try:
+                async for window in windows_at_silences(
+                    audio_path, duration, window_seconds, overlap_seconds=settings.TRANSCRIPTION_WINDOW_OVERLAP
+                ):
+                    planned.put_nowait((window, asyncio.create_task(transcribe(window))))
+            finally:
+                planned.put_nowait(None)
+
+        planner = asyncio.create_task(plan())
+        tasks = []
+        try:
+            while (item := await planned.get()) is not None:
+                window, task = item
+                tasks.append(task)
+                result = await task
+                print(f"Transcribed window {window.start:.0f}-{window.end:.0f}s of {duration:.0f}s")
+                yield result
+            # Raises if planning failed part way
+            await planner
+        finally:
+            planner.cancel()
+            while not planned.empty():
+                item = planned.get_nowait()
+                if item is not None:
+                    tasks.append(item[1])
+            for task in tasks:
+                task.cancel()
+
+    async def _transcribe_window(self, audio_path: str, window: AudioWindow) -> Dict[str, Any]:
+        window_path = await extract_window(audio_path, window.start, window.end)
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(settings.TRANSCRIPTION_MAX_ATTEMPTS),
+                wait=wait_exponential(multiplier=1, min=2, max=30),
+                reraise=True,
+            ):
+                with attempt:
+                    response = await self._transcribe_file(window_path)
+        finally:
+            os.remove(window_path)
+
+        result = self._parse_response(response, offset=window.start)
+        result['paragraphs'] = self._owned_paragraphs(result['paragraphs'], window)
+        result['transcript'] = " ".join(
+            sentence["text"] for paragraph in result['paragraphs'] for sentence in paragraph["sentences"]
+        )
+        return result
+
+    def _owned_paragraphs(self, paragraphs: List[dict], window: AudioWindow) -> List[dict]:
+        """Drop the sentences of the overlap padding, the neighbouring window owns them."""
+        owned = []
+        for paragraph in paragraphs:
+            sentences = [
+                sentence for sentence in paragraph["sentences"]
+                if window.own_start <= (sentence["start"] + sentence["end"]) / 2 < window.own_end
             ]
+            if sentences:
+                owned.append({
+                    "paragraph_start": sentences[0]["start"],
+                    "paragraph_end": sentences[-1]["end"],
+                    "sentences": sentences
+                })
+        return owned
+
+    async def _transcribe_file(self, audio_path: str, mimetype: str = 'audio/mp3') -> Dict[str, Any]:
+        """
+        Send a file to Deepgram's REST API without blocking the event loop.
+        The file is streamed from disk in chunks, never loaded whole, and the
+        response is cached by the audio digest and the request options.
+        """
+        cache_key = f"{await asyncio.to_thread(file_digest, audio_path)}:{options_key(self.options)}"
+        cached = transcription_cache.get_json(cache_key)
+        if cached is not None:
+            print(f"Transcription cache hit for {audio_path}")
+            return cached
+
+        async def file_chunks():
+            async with aiofiles.open(audio_path, 'rb') as audio:
+                while chunk := await audio.read(settings.UPLOAD_CHUNK_SIZE):
+                    yield chunk
+
+        response = await get_http_client().post(
+            DEEPGRAM_LISTEN_URL,
+            params={key: str(value).lower() if isinstance(value, bool) else value
+                    for key, value in self.options.items()},
+            headers={
+                "Authorization": f"Token {self.api_key}",
+                "Content-Type": mimetype,
+                "Content-Length": str(os.path.getsize(audio_path)),
+            },
+            content=file_chunks(),
+        )
+        response.raise_for_status()
+        result = response.json()
+        transcription_cache.put_json(cache_key, result)
+        return result
+
+    def _parse_response(self, response, offset: float = 0.0) -> Dict[str, Any]:
+        alternative = response['results']['channels'][0]['alternatives'][0]
+        paragraphs_data = alternative['paragraphs']['paragraphs']
 
+        # Create a list of paragraphs and their sentences
+        paragraphs_list = [
+            {
+                "paragraph_start": paragraph["start"] + offset,
+                "paragraph_end": paragraph["end"] + offset,
+                "sentences": [
+                    {
+                        "text": sentence["text"],
+                        "start": sentence["start"] + offset,
+                        "end": sentence["end"] + offset
+                    }
+                    for sentence in paragraph["sentences"]
+                ]
+            }
+            for paragraph in paragraphs_data
+        ]
 
-            return {
-                'transcript':response['results']['channels'][0]['alternatives'][0]['transcript'],
-                'summary':response['results']['channels'][0]['alternatives'][0]['summaries'][0],
-                'paragraphs':paragraphs_list
-            }
\ No newline at end of file
+        summary = (alternative.get('summaries') or [None])[0]
+        return {
+            'transcript':alternative['transcript'],
+            'summary':summary,
+            'paragraphs':paragraphs_list
+        }
@@ -1,10 +1,28 @@
+import asyncio
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Tuple
 
 from openai import AsyncOpenAI
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential
 from ..core.config import settings
+from .token_chunker import TokenBudgetChunker
+from .transcript_encoder import TranscriptEncoder
 from pydantic import BaseModel, Field
 
+# Bump whenever a prompt, a model or the shape of an analysis changes, so that
+# results stored in the content index under the old version are recomputed
+ANALYSIS_VERSION = 1
+
+
+def chunking_options() -> Dict[str, Any]:
+    """Settings that change how a transcript is chunked and reduced, for content index keys."""
+    return {
+        "chunk_input_tokens": settings.CHUNK_INPUT_TOKEN_BUDGET,
+        "chunk_output_tokens": settings.CHUNK_OUTPUT_TOKEN_BUDGET,
+        "chunk_output_ratio": settings.CHUNK_OUTPUT_RATIO,
+        "overall_fan_in": settings.OVERALL_ANALYSIS_FAN_IN,
+    }
+
 
 class TranslateResponse(BaseModel):
     translation: str
@@ -76,6 +94,8 @@ class LectureAnalysis(BaseModel):
 class TranslationAnalysisService:
     def __init__(self):
         self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.encoder = TranscriptEncoder(model="gpt-4o-mini")
+        self.chunker = TokenBudgetChunker(model="gpt-4o-mini", render=self.encoder.encode_paragraph)
 
     async def analyze_material_text(self, paragraphs: List[str]) -> Dict[str, Any]:
         """Analyze text extracted from a PDF file."""
@@ -158,14 +178,77 @@ class TranslationAnalysisService:
             print(f"Error analyzing lecture text: {e}")
             raise
 
-    async def analyze_full_text(self, paragraphs: List[dict]) -> dict:
-        chunks = self.chunk_paragraphs_by_time(paragraphs)
-        chunk_results = []
+    async def analyze_full_text(self, paragraphs: List[dict], concurrency: int = None) -> dict:
+        chunks = self.chunker.chunk(paragraphs)
+        chunk_stats = self.chunker.stats(chunks)
+        print('chunk_stats:', chunk_stats)
+        semaphore = asyncio.Semaphore(concurrency or settings.ANALYSIS_CONCURRENCY)
+
+        async def analyze(chunk: dict):
+            async with semaphore:
+                return await self.analyze_chunk_with_retry(chunk["paragraphs"])
+
+        # gather keeps the results in chunk order
+        chunk_results = await asyncio.gather(*(analyze(chunk) for chunk in chunks))
+        return await self._combine_chunk_results(list(chunk_results), chunk_stats)
+
+    async def analyze_transcription_stream(self, windows: AsyncIterator[Dict[str, Any]],
+                                           concurrency: int = None) -> Tuple[Dict[str, Any], dict]:
+        """
+        Analyze a transcription that arrives window by window.
+
+        Paragraphs are chunked as they arrive and every chunk that can no
+        longer grow is analyzed right away, while later windows are still
+        being transcribed. Returns the combined transcription and the same
+        analysis as `analyze_full_text`.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.ANALYSIS_CONCURRENCY)
+
+        async def analyze(chunk: dict):
+            async with semaphore:
+                return await self.analyze_chunk_with_retry(chunk["paragraphs"])
+
+        transcripts, summaries, all_paragraphs = [], [], []
+        all_chunks, tasks = [], []
+        pending_paragraphs = []
 
-        for chunk in chunks:
-            result = await self.analyze_chunks(chunk["paragraphs"])
-            chunk_results.append(result)
+        def submit(chunk: dict):
+            all_chunks.append(chunk)
+            tasks.append(asyncio.create_task(analyze(chunk)))
 
+        try:
+            async for window in windows:
+                transcripts.append(window["transcript"])
+                summaries.append(window["summary"])
+                all_paragraphs.extend(window["paragraphs"])
+                pending_paragraphs.extend(window["paragraphs"])
+
+                # Every chunk but the last is complete, the last one may still grow
+                chunks = self.chunker.chunk(pending_paragraphs)
+                for chunk in chunks[:-1]:
+                    submit(chunk)
+                pending_paragraphs = chunks[-1]["paragraphs"] if chunks else []
+
+            for chunk in self.chunker.chunk(pending_paragraphs):
+                submit(chunk)
+
+            # gather keeps the results in chunk order
+            chunk_results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        chunk_stats = self.chunker.stats(all_chunks)
+        print('chunk_stats:', chunk_stats)
+        transcription = {
+            "transcript": " ".join(transcripts),
+            "summary": summaries[0] if len(summaries) == 1 else summaries,
+            "paragraphs": all_paragraphs,
+        }
+        return transcription, await self._combine_chunk_results(list(chunk_results), chunk_stats)
+
+    async def _combine_chunk_results(self, chunk_results: List[Any], chunk_stats: Dict[str, Any]) -> dict:
         # Since chunk_results contains AnalysisResult objects, we need to access their data correctly
         all_topics = []
         translations = []
@@ -190,23 +273,16 @@ class TranslationAnalysisService:
             "overall_summary": "Overall Summary",
             "overall_description": "Overall Description",
             "complete_translation": complete_translation,
-            "topics": chunk_results
+            "topics": chunk_results,
+            "chunk_stats": chunk_stats
         }
 
-        overall_analysis_response = await self.client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            response_format=OverallAnalysisResponse,
-            messages=[{"role": "user", "content": f""""
-             You are give a English Transcript of a Video, you are supposed to provide an overall analysis of the video.
-                Please do the following in JSON format:
-                1. Provide an "overall_topic", "overall_summary", and "overall_description" for the entire text.
-                Transcript:
-                {complete_translation}
-            """}]
-        )
-
-
-        overall_analysis_data = overall_analysis_response.choices[0].message.parsed
+        # Build the overall analysis from the segment summaries instead of the full translation
+        segment_summaries = [
+            f"[{topic['start_time']}-{topic['end_time']}] {topic['topic']}: {topic['summary']}"
+            for topic in all_topics
+        ]
+        overall_analysis_data = await self.reduce_overall_analysis(segment_summaries)
         print('overall_analysis_response:', overall_analysis_data)
         overall_analysis["overall_topic"] = overall_analysis_data.overall_topic
         overall_analysis["overall_summary"] = overall_analysis_data.overall_summary
@@ -215,7 +291,61 @@ class TranslationAnalysisService:
         return overall_analysis
 
 
+    async def reduce_overall_analysis(self, summaries: List[str], fan_in: int = None) -> OverallAnalysisResponse:
+        """
+        Combine segment summaries into one overall analysis, map-reduce style:
+        summaries are analyzed in groups of `fan_in`, the group results are
+        grouped again, and so on until a single analysis is left. The prompt
+        size stays bounded and the number of levels grows logarithmically.
+        """
+        fan_in = max(2, fan_in or settings.OVERALL_ANALYSIS_FAN_IN)
+        semaphore = asyncio.Semaphore(settings.ANALYSIS_CONCURRENCY)
+
+        async def analyze_group(group: List[str]) -> OverallAnalysisResponse:
+            async with semaphore:
+                return await self.analyze_summaries(group)
+
+        level = summaries or ["(empty transcript)"]
+        while True:
+            groups = [level[i:i + fan_in] for i in range(0, len(level), fan_in)]
+            results = await asyncio.gather(*(analyze_group(group) for group in groups))
+            if len(results) == 1:
+                return results[0]
+            level = [
+                f"{result.overall_topic}: {result.overall_summary}" for result in results
+            ]
+
+    async def analyze_summaries(self, summaries: List[str]) -> OverallAnalysisResponse:
+        summaries_text = "\n".join(summaries)
+        response = await self.client.beta.chat.completions.parse(
+            model="gpt-4o-mini",
+            response_format=OverallAnalysisResponse,
+            messages=[{"role": "user", "content": f"""
+             You are given summaries of consecutive parts of an English Transcript of a Video, in order.
+             You are supposed to provide an overall analysis of the video part they cover.
+                Please do the following in JSON format:
+                1. Provide an "overall_topic", "overall_summary", and "overall_description" for the entire text.
+                Summaries:
+                {summaries_text}
+            """}]
+        )
+        return response.choices[0].message.parsed
+
+    async def analyze_chunk_with_retry(self, paragraphs: List[dict]) -> dict:
+        """Analyze one chunk, retrying it on its own if the call fails."""
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(settings.ANALYSIS_MAX_ATTEMPTS),
+            wait=wait_exponential(multiplier=1, min=2, max=30),
+            reraise=True,
+        ):
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    print(f"Retrying chunk analysis, attempt {attempt.retry_state.attempt_number}")
+                return await self.analyze_chunks(paragraphs)
+
     async def analyze_chunks(self, paragraphs: List[dict]) -> dict:
+        transcript = self.encoder.encode_paragraphs(paragraphs)
+        print('transcript tokens:', self.encoder.token_report(paragraphs, transcript))
         prompt = f"""
         You are given a Hindi/English transcript with timestamps in brackets like [start-end].
         You have to translate the text to English and analyze it.
@@ -259,7 +389,7 @@ class TranslationAnalysisService:
         }}
 
         Transcript with timestamps:
-        {paragraphs}
+        {transcript}
         """
 
         # (C) Send the prompt to OpenAI
@@ -274,47 +404,3 @@ class TranslationAnalysisService:
         # print(f"parsed_data: {parsed_data}")
         # Return as dictionary
         return parsed_data
-
-
-    def chunk_paragraphs_by_time(self,paragraphs, chunk_size=1000.0):
-        # Sort by start time
-        paragraphs_sorted = sorted(paragraphs, key=lambda p: p["paragraph_start"])
-
-        chunks = []
-        current_chunk = []
-
-        current_start = 0.0
-        current_end = chunk_size
-
-        idx = 0
-        while idx < len(paragraphs_sorted):
-            para = paragraphs_sorted[idx]
-
-            # If the paragraph lies (at least partially) within the current segment
-            if para["paragraph_start"] < current_end:
-                current_chunk.append(para)
-                idx += 1
-            else:
-                # We’ve reached a paragraph that falls outside current 10-min window
-                # store the current chunk if not empty
-                if current_chunk:
-                    chunks.append({
-                        "start_time": current_start,
-                        "end_time": current_end,
-                        "paragraphs": current_chunk
-                    })
-
-                # move to the next 10-min window
-                current_start = current_end
-                current_end += chunk_size
-                current_chunk = []
-
-        # handle any leftover paragraphs
-        if current_chunk:
-            chunks.append({
-                "start_time": current_start,
-                "end_time": current_end,
-                "paragraphs": current_chunk
-            })
-
-        return chunks
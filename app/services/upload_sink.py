@@ -0,0 +1,87 @@
+import hashlib
+import os
+import uuid
+
+import aiofiles
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from ..core.config import settings
+
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum size"""
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject requests whose Content-Length is over MAX_UPLOAD_SIZE with 413
+    before any of the body is read. Starlette spools a multipart upload to
+    its own temporary file before the route runs, so without this an
+    oversized upload is received in full first; `save_upload` still checks
+    bodies sent without a length.
+    """
+
+    def __init__(self, app, max_bytes: int = None):
+        self.app = app
+        self.max_bytes = max_bytes or settings.MAX_UPLOAD_SIZE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            length = dict(scope["headers"]).get(b"content-length", b"")
+            if length.isdigit() and int(length) > self.max_bytes + MULTIPART_OVERHEAD:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Upload exceeds the maximum size of {self.max_bytes} bytes"},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class SavedUpload(BaseModel):
+    file_path: str
+    sha256: str
+    size: int
+
+
+async def save_upload(upload_file: UploadFile, dest_dir: str = None, prefix: str = "",
+                      max_bytes: int = None, chunk_size: int = None) -> SavedUpload:
+    """
+    Stream an upload to a unique path on disk in fixed-size chunks, hashing it
+    on the way, so memory use stays flat regardless of the file size.
+    The partial file is removed if the upload exceeds `max_bytes` or fails.
+    """
+    dest_dir = dest_dir or settings.TEMP_UPLOAD_DIR
+    max_bytes = max_bytes or settings.MAX_UPLOAD_SIZE
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    os.makedirs(dest_dir, exist_ok=True)
+
+    file_name = os.path.basename(upload_file.filename or "upload")
+    file_path = os.path.join(dest_dir, f"{prefix}{uuid.uuid4().hex}_{file_name}")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(file_path, 'wb') as out_file:
+            while chunk := await upload_file.read(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"Upload exceeds the maximum size of {max_bytes} bytes"
+                    )
+                digest.update(chunk)
+                await out_file.write(chunk)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    print(f"Received {size} bytes for {file_name}, saved to {file_path}")
+    return SavedUpload(file_path=file_path, sha256=digest.hexdigest(), size=size)
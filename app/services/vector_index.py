@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+
+
+def parse_embedding(value) -> Optional[List[float]]:
+    """pgvector columns come back from PostgREST as '[0.1,...]' strings."""
+    if value is None:
+        return None
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def lecture_index_name(lecture_id: int) -> str:
+    return f"lecture_{lecture_id}"
+
+
+def course_index_name(course_id: int) -> str:
+    return f"course_{course_id}"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Store normalized float32 vectors as float32, float16 or int8. int8 uses
+    one scale per vector (its largest absolute value / 127), returned next
+    to the matrix; the other modes have no scales.
+    """
+    if dtype == "float32":
+        return matrix.astype(np.float32), None
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, np.float32)
+        scales[scales == 0] = 1.0
+        quantized = np.round(matrix / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unsupported vector index dtype: {dtype}")
+
+
+class VectorIndex:
+    """
+    Unit-length embeddings of one lecture or course, together with the ids
+    of the rows they belong to. A dot product with a normalized query is its
+    cosine similarity. Only ids are kept, the rows themselves are read from
+    the database for the results of a search, so they are never stale.
+
+    The matrix may be quantized to float16 or int8 (with per-vector
+    `scales`). Scores are then approximate, so when the exact float32
+    vectors are available the best `rerank` candidates are re-scored with
+    them before the threshold and the top-k cut are applied.
+    """
+
+    # Rows converted to float32 at a time when scoring a quantized matrix, small enough to stay in cache
+    SCORE_BLOCK_ROWS = 1024
+    # Candidates for re-ranking may score this much below the threshold before re-scoring
+    RERANK_MARGIN = 0.02
+
+    def __init__(self, matrix: np.ndarray, rows: List[dict], mtime: float = 0.0,
+                 scales: np.ndarray = None, exact: np.ndarray = None, rerank: int = 0):
+        self.matrix = matrix
+        self.rows = rows
+        self.mtime = mtime
+        self.scales = scales
+        self.exact = exact
+        self.rerank = rerank
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the matrix that is scanned on every search."""
+        return self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        if self.matrix.dtype == np.float32:
+            return self.matrix @ query
+        scores = np.empty(len(self.rows), dtype=np.float32)
+        for start in range(0, len(self.rows), self.SCORE_BLOCK_ROWS):
+            block = self.matrix[start:start + self.SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search(self, query_embedding: List[float], top_k: int, match_threshold: float,
+               rerank: int = None) -> List[dict]:
+        """
+        The `top_k` rows most similar to the query, most similar first, with a
+        `similarity` field. Like the match_* database functions, only rows with
+        a similarity above `match_threshold` are returned.
+        """
+        if not self.rows:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = self.scores(query)
+
+        rerank = self.rerank if rerank is None else rerank
+        if rerank and self.exact is not None and self.matrix.dtype != np.float32:
+            # Sorted, so the memory-mapped exact vectors are read in file order
+            candidates = np.sort(top_indices(scores, max(rerank, top_k), match_threshold - self.RERANK_MARGIN))
+            exact = np.asarray(self.exact[candidates]) @ query
+            scores = np.full(len(self.rows), -np.inf, dtype=np.float32)
+            scores[candidates] = exact
+
+        candidates = top_indices(scores, top_k, match_threshold)
+        return [{**self.rows[index], "similarity": float(scores[index])} for index in candidates]
+
+
+def top_indices(scores: np.ndarray, top_k: int, threshold: float) -> np.ndarray:
+    """Indices of the `top_k` highest scores above `threshold`, highest first."""
+    candidates = np.flatnonzero(scores > threshold)
+    if len(candidates) > top_k:
+        candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class VectorIndexStore:
+    """
+    Local vector indexes, one per lecture or course, so that search does not
+    scan the vectors in the database on every question.
+
+    Each index is persisted in VECTOR_INDEX_DIR as .npy matrices, opened
+    memory-mapped, and a .json file with the ids of its rows. The searched matrix is
+    stored as VECTOR_INDEX_DTYPE; float16 and int8 take a half and a quarter
+    of the memory of float32 (an eighth of the float64 lists Supabase
+    returns). For quantized indexes the exact float32 vectors are kept in a
+    separate file that is only read for the VECTOR_INDEX_RERANK best
+    candidates of a search.
+
+    Indexes are built on the first search that needs them and kept loaded, up
+    to VECTOR_INDEX_MAX_LOADED per process. `invalidate` deletes the files
+    when embeddings are written and when a lecture version is published;
+    every process on this host notices on its next search because the
+    file's mtime no longer matches the one it loaded, and rebuilds. Other
+    hosts do not see the deletion, which is why "rpc" search is the default
+    and "local" is meant for a single host.
+    """
+
+    def __init__(self, index_dir: str = None, max_loaded: int = None, dtype: str = None, rerank: int = None):
+        self.index_dir = index_dir or settings.VECTOR_INDEX_DIR
+        self.max_loaded = max_loaded or settings.VECTOR_INDEX_MAX_LOADED
+        self.dtype = dtype or settings.VECTOR_INDEX_DTYPE
+        self.rerank = settings.VECTOR_INDEX_RERANK if rerank is None else rerank
+        self._loaded: "OrderedDict[str, VectorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def _paths(self, name: str) -> Dict[str, str]:
+        base = os.path.join(self.index_dir, name)
+        return {
+            "rows": base + ".json",
+            "scales": base + ".scales.npy",
+            "exact": base + ".f32.npy",
+            # Written last, its mtime identifies the version of the index
+            "matrix": base + ".npy",
+        }
+
+    def _mtime(self, name: str) -> Optional[float]:
+        try:
+            return os.stat(self._paths(name)["matrix"]).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def get(self, name: str, build: Callable[[], Tuple[List[List[float]], List[dict]]]) -> VectorIndex:
+        """The index `name`, loaded from disk or built with `build` on first use."""
+        mtime = self._mtime(name)
+        with self._lock:
+            index = self._loaded.get(name)
+            if index is not None and mtime is not None and index.mtime == mtime:
+                self._loaded.move_to_end(name)
+                return index
+
+        index = self.load(name) if mtime is not None else None
+        # Built before VECTOR_INDEX_DTYPE was changed
+        if index is None or (index.rows and index.matrix.dtype != np.dtype(self.dtype)):
+            embeddings, rows = build()
+            self.save(name, embeddings, rows)
+            index = self.load(name)
+
+        with self._lock:
+            self._loaded[name] = index
+            self._loaded.move_to_end(name)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return index
+
+    def save(self, name: str, embeddings: List[List[float]], rows: List[dict]):
+        """Write an index atomically, so concurrent readers see the old or the new one."""
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(rows), -1) if rows else np.zeros((0, 0), np.float32)
+        matrix = normalize_rows(matrix)
+        stored, scales = quantize(matrix, self.dtype)
+        arrays = {"matrix": stored, "scales": scales, "exact": matrix if self.dtype != "float32" else None}
+
+        paths = self._paths(name)
+        with open(paths["rows"] + ".tmp", "w") as file:
+            json.dump(rows, file)
+        for kind, array in arrays.items():
+            if array is not None:
+                with open(paths[kind] + ".tmp", "wb") as file:
+                    np.save(file, array)
+        for kind, path in paths.items():
+            if kind == "rows" or arrays[kind] is not None:
+                os.replace(path + ".tmp", path)
+            elif os.path.exists(path):
+                os.remove(path)
+        print(f"Built {self.dtype} vector index {name} with {len(rows)} vectors")
+
+    def load(self, name: str) -> VectorIndex:
+        paths = self._paths(name)
+        for _ in range(3):
+            mtime = os.stat(paths["matrix"]).st_mtime
+            with open(paths["rows"]) as file:
+                rows = json.load(file)
+            # Empty arrays cannot be memory-mapped
+            mmap_mode = "r" if rows else None
+            matrix = np.load(paths["matrix"], mmap_mode=mmap_mode)
+            scales = np.load(paths["scales"]) if os.path.exists(paths["scales"]) else None
+            exact = np.load(paths["exact"], mmap_mode=mmap_mode) if os.path.exists(paths["exact"]) else None
+            if matrix.shape[0] == len(rows) and (matrix.dtype != np.int8 or scales is not None):
+                return VectorIndex(matrix, rows, mtime, scales=scales, exact=exact, rerank=self.rerank)
+            # Caught between the renames of a concurrent save
+        raise ValueError(f"Vector index {name} has mismatched matrix and rows")
+
+    def invalidate(self, name: str):
+        for path in self._paths(name).values():
+            if os.path.exists(path):
+                os.remove(path)
+        with self._lock:
+            self._loaded.pop(name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "dtype": self.dtype,
+                "loaded": len(self._loaded),
+                "vectors": sum(len(index.rows) for index in self._loaded.values()),
+                "bytes": sum(index.nbytes for index in self._loaded.values()),
+            }
+
+
+vector_index_store = VectorIndexStore()
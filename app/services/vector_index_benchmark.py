@@ -0,0 +1,124 @@
+"""
+Memory, latency and recall@k of the vector index storage modes.
+
+    python -m app.services.vector_index_benchmark [--lecture-id N | --course-id N] [--k 3]
+
+Without an id the benchmark runs on synthetic vectors that are as similar to
+each other as ada-002 embeddings of one course usually are. Recall@k is the
+share of the exact float32 results (above the match threshold) that a mode
+returns too.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from .vector_index import VectorIndexStore, normalize_rows
+
+MODES = [
+    ("float32", 0),
+    ("float16", 0),
+    ("float16", 50),
+    ("int8", 0),
+    ("int8", 50),
+]
+
+
+def synthetic_embeddings(count: int, dim: int = 1536, clusters: int = 20, seed: int = 0) -> np.ndarray:
+    """Vectors around one shared direction, grouped by topic, with cosine similarities of roughly 0.6-0.95."""
+    rng = np.random.default_rng(seed)
+    shared = rng.normal(size=dim)
+    topics = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=count)
+    vectors = 2.5 * shared + 1.2 * topics[labels] + rng.normal(size=(count, dim))
+    return normalize_rows(vectors.astype(np.float32))
+
+
+def make_queries(embeddings: np.ndarray, count: int, noise: float = 0.5, seed: int = 1) -> np.ndarray:
+    """Stored vectors with noise, the way a question is close to but not equal to a segment."""
+    rng = np.random.default_rng(seed)
+    picks = embeddings[rng.integers(0, len(embeddings), size=count)]
+    noise_vectors = rng.normal(size=picks.shape).astype(np.float32) / np.sqrt(picks.shape[1])
+    return normalize_rows(picks + noise * noise_vectors)
+
+
+def run(embeddings: np.ndarray, queries: np.ndarray, k: int, match_threshold: float) -> List[Tuple]:
+    rows = [{"id": index} for index in range(len(embeddings))]
+    index_dir = tempfile.mkdtemp(prefix="vector_index_benchmark_")
+    try:
+        exact = VectorIndexStore(index_dir, dtype="float32", rerank=0)
+        exact.save("exact", embeddings, rows)
+        truth = [
+            {row["id"] for row in exact.load("exact").search(query, k, match_threshold)}
+            for query in queries
+        ]
+
+        results = []
+        for dtype, rerank in MODES:
+            store = VectorIndexStore(index_dir, dtype=dtype, rerank=rerank)
+            name = f"{dtype}_{rerank}"
+            store.save(name, embeddings, rows)
+            index = store.load(name)
+            # Read the memory-mapped files once so latency is not dominated by the first page faults
+            index.search(queries[0], k, match_threshold)
+
+            hits, expected = 0, 0
+            started = time.perf_counter()
+            for query, relevant in zip(queries, truth):
+                found = {row["id"] for row in index.search(query, k, match_threshold)}
+                hits += len(found & relevant)
+                expected += len(relevant)
+            latency = (time.perf_counter() - started) / len(queries)
+
+            results.append((
+                dtype, rerank, index.nbytes / len(rows), hits / expected if expected else 1.0, latency * 1000
+            ))
+        return results
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+def load_embeddings(lecture_id: int = None, course_id: int = None) -> np.ndarray:
+    from .embedding_service import EmbeddingService
+
+    service = EmbeddingService()
+    if lecture_id is not None:
+        from .lecture_store import live_segments
+        rows, key = live_segments(service.supabase, lecture_id, 'id, embedding'), 'id'
+    else:
+        rows = service.supabase.table('lectures').select('lecture_id, embedding').eq('course_id', course_id).execute().data
+        key = 'lecture_id'
+    embeddings, _ = service._index_rows(rows, key)
+    if not embeddings:
+        raise SystemExit("No embeddings found, generate them first")
+    return normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lecture-id", type=int)
+    parser.add_argument("--course-id", type=int)
+    parser.add_argument("--vectors", type=int, default=20000, help="number of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    args = parser.parse_args()
+
+    if args.lecture_id is not None or args.course_id is not None:
+        embeddings = load_embeddings(args.lecture_id, args.course_id)
+    else:
+        embeddings = synthetic_embeddings(args.vectors)
+    queries = make_queries(embeddings, args.queries)
+
+    print(f"{len(embeddings)} vectors of {embeddings.shape[1]} dimensions, {len(queries)} queries, "
+          f"k={args.k}, threshold={args.threshold}")
+    print(f"{'dtype':<8} {'rerank':>6} {'bytes/vector':>13} {f'recall@{args.k}':>10} {'ms/query':>9}")
+    for dtype, rerank, bytes_per_vector, recall, latency in run(embeddings, queries, args.k, args.threshold):
+        print(f"{dtype:<8} {rerank:>6} {bytes_per_vector:>13.0f} {recall:>10.3f} {latency:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
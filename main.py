@@ -1,8 +1,28 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import media_processing
+from app.services.job_queue import job_queue
+from app.services.process_pool import process_pool
+from app.services.transcription_service import close_http_client
+from app.services.upload_sink import UploadSizeLimitMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the background job workers and resume interrupted jobs
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await close_http_client()
+    process_pool.shutdown()
+
+
+app = FastAPI(title="Media Analysis API", lifespan=lifespan)
 
-app = FastAPI(title="Media Analysis API")
+# Refuse oversized uploads from their Content-Length, before the body is read
+app.add_middleware(UploadSizeLimitMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -0,0 +1,27 @@
+-- Bulk writes of embeddings used by EmbeddingService._write_embeddings.
+-- Only the embedding and its hash are updated; other columns are left untouched.
+
+ALTER TABLE segments ADD COLUMN IF NOT EXISTS embedding_hash text;
+ALTER TABLE lectures ADD COLUMN IF NOT EXISTS embedding_hash text;
+
+CREATE OR REPLACE FUNCTION update_segment_embeddings(ids bigint[], embeddings text[], hashes text[])
+RETURNS void
+LANGUAGE sql
+AS $$
+    UPDATE segments AS s
+    SET embedding = u.embedding::vector,
+        embedding_hash = u.hash
+    FROM unnest(ids, embeddings, hashes) AS u(id, embedding, hash)
+    WHERE s.id = u.id;
+$$;
+
+CREATE OR REPLACE FUNCTION update_lecture_embeddings(ids bigint[], embeddings text[], hashes text[])
+RETURNS void
+LANGUAGE sql
+AS $$
+    UPDATE lectures AS l
+    SET embedding = u.embedding::vector,
+        embedding_hash = u.hash
+    FROM unnest(ids, embeddings, hashes) AS u(id, embedding, hash)
+    WHERE l.lecture_id = u.id;
+$$;
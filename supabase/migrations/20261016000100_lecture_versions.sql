@@ -0,0 +1,32 @@
+-- Versioned lecture artifacts used by LectureStore.
+-- Segments and resources are written under a version that only becomes
+-- visible once lectures.current_version points at it. Rows written before
+-- versioning have a NULL version.
+
+ALTER TABLE segments ADD COLUMN IF NOT EXISTS version integer;
+ALTER TABLE resources ADD COLUMN IF NOT EXISTS version integer;
+ALTER TABLE lectures ADD COLUMN IF NOT EXISTS current_version integer;
+
+CREATE INDEX IF NOT EXISTS segments_lecture_version_idx ON segments (lecture_id, version);
+CREATE INDEX IF NOT EXISTS resources_lecture_version_idx ON resources (lecture_id, version);
+
+-- Last version handed out by allocate_lecture_version, so no two jobs ever
+-- write under the same version, even when one of them never publishes.
+ALTER TABLE lectures ADD COLUMN IF NOT EXISTS last_version integer;
+
+-- The row lock taken by the UPDATE serializes concurrent calls for a lecture.
+-- The first call for a lecture starts above every version it already has rows for.
+CREATE OR REPLACE FUNCTION allocate_lecture_version(target_lecture_id bigint)
+RETURNS integer
+LANGUAGE sql
+AS $$
+    UPDATE lectures AS l
+    SET last_version = GREATEST(
+        COALESCE(l.last_version, 0),
+        COALESCE(l.current_version, 0),
+        COALESCE((SELECT MAX(s.version) FROM segments AS s WHERE s.lecture_id = l.lecture_id), 0),
+        COALESCE((SELECT MAX(r.version) FROM resources AS r WHERE r.lecture_id = l.lecture_id), 0)
+    ) + 1
+    WHERE l.lecture_id = target_lecture_id
+    RETURNING l.last_version;
+$$;
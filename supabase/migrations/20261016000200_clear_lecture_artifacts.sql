@@ -0,0 +1,31 @@
+-- Deletes of lecture artifacts used by LectureStore, run in one transaction
+-- so readers never see segments without their resources or a half-cleared lecture.
+-- Without filters every artifact of the lecture is deleted. keep_version
+-- keeps that version and newer ones (unversioned rows are always older),
+-- only_version deletes that version alone.
+
+CREATE OR REPLACE FUNCTION clear_lecture_artifacts(
+    target_lecture_id bigint,
+    keep_version integer DEFAULT NULL,
+    only_version integer DEFAULT NULL
+)
+RETURNS void
+LANGUAGE sql
+AS $$
+    DELETE FROM segment_resources AS sr
+    USING segments AS s
+    WHERE sr.segment_id = s.id
+      AND s.lecture_id = target_lecture_id
+      AND (only_version IS NULL OR s.version = only_version)
+      AND (keep_version IS NULL OR s.version IS NULL OR s.version < keep_version);
+
+    DELETE FROM segments AS s
+    WHERE s.lecture_id = target_lecture_id
+      AND (only_version IS NULL OR s.version = only_version)
+      AND (keep_version IS NULL OR s.version IS NULL OR s.version < keep_version);
+
+    DELETE FROM resources AS r
+    WHERE r.lecture_id = target_lecture_id
+      AND (only_version IS NULL OR r.version = only_version)
+      AND (keep_version IS NULL OR r.version IS NULL OR r.version < keep_version);
+$$;